@@ -9,13 +9,22 @@ MONGO_URI = os.getenv("MONGO_URI")
 if not MONGO_URI:
     print("⚠️ MONGO_URI not found. Please add it to Hugging Face secrets.")
 
-try:
-    client = MongoClient(MONGO_URI)
-    client.admin.command('ping')
-    print("✅ MongoDB Connected Successfully")
-except Exception as e:
-    print(f"❌ MongoDB Connection Failed: {e}")
+# connect=False: no sockets are opened at import time. The first query (or the
+# ping_database() call in the app lifespan) establishes the connection.
+client = MongoClient(MONGO_URI, connect=False)
+
+def ping_database():
+    try:
+        client.admin.command('ping')
+        print("✅ MongoDB Connected Successfully")
+    except Exception as e:
+        print(f"❌ MongoDB Connection Failed: {e}")
 
 db = client["audio_notary"]
 users_collection = db["users"]
-reports_collection = db["reports"]
\ No newline at end of file
+reports_collection = db["reports"]
+baselines_collection = db["baseline_profiles"]
+rate_limits_collection = db["rate_limits"]
+previews_collection = db["previews"]
+# Inverted index of acoustic fingerprint hashes -> report (see services/fingerprint.py)
+fingerprints_collection = db["fingerprints"]
\ No newline at end of file
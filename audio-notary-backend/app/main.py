@@ -1,13 +1,29 @@
 from dotenv import load_dotenv 
 load_dotenv()                 
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 # CLEANED UP IMPORTS:
 from app.routes import auth_routes, analyze, explain 
 # Add this import at the top
 from app.routes import auth_routes, analyze, explain, compare
 
-app = FastAPI()
+from app.services.audio_io import cleanup_scratch_dir
+from app.compression import CompressionMiddleware
+from app.database import ping_database
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sweep upload scratch files orphaned by crashed workers
+    cleanup_scratch_dir()
+    # Warm the Mongo connection in the background so it never blocks startup
+    ping_task = asyncio.create_task(run_in_threadpool(ping_database))
+    yield
+    ping_task.cancel()
+
+app = FastAPI(lifespan=lifespan)
 
 # --- THE NUCLEAR FIX ---
 # We use regex='.*' to allow ANY origin (Mobile, Vercel, Localhost)
@@ -17,8 +33,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let browsers read the queue/rate-limit headers
+    expose_headers=["X-Queue-Position", "X-Queue-Wait-Ms", "X-RateLimit-Limit", "X-RateLimit-Remaining", "Retry-After"],
 )
 
+# gzip/brotli for larger bodies (history, compare); small replies stay uncompressed
+app.add_middleware(CompressionMiddleware)
+
 @app.get("/")
 def read_root():
     return {"message": "Audio Notary Backend is Live on Hugging Face!"}
@@ -0,0 +1,51 @@
+import datetime
+
+import msgpack
+import orjson
+from bson import ObjectId
+from fastapi import Request
+from fastapi.responses import Response
+
+# ------------------------------
+# CONTENT NEGOTIATION
+# ------------------------------
+# Result-heavy endpoints (history, compare) skip FastAPI's jsonable_encoder and the
+# recursive sanitize_json walk: orjson writes NaN/Infinity as null itself, and clients
+# that send `Accept: application/msgpack` get a compact binary body instead.
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    if hasattr(obj, "item"):  # numpy scalars
+        return obj.item()
+    raise TypeError(f"Type is not serializable: {type(obj).__name__}")
+
+class ORJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        )
+
+class MsgPackResponse(Response):
+    media_type = "application/msgpack"
+
+    def render(self, content) -> bytes:
+        return msgpack.packb(content, default=_default, use_bin_type=True)
+
+def wants_msgpack(request: Request):
+    accept = request.headers.get("accept", "")
+    return any(t in accept for t in MSGPACK_TYPES)
+
+def negotiated_response(request: Request, content, status_code=200, headers=None):
+    """JSON (orjson) by default, msgpack when the client asks for it"""
+    response_class = MsgPackResponse if wants_msgpack(request) else ORJSONResponse
+    response = response_class(content, status_code=status_code, headers=headers)
+    response.headers["Vary"] = "Accept"
+    return response
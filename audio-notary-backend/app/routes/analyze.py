@@ -1,14 +1,22 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from app.services.forensics import analyze_audio_forensics
-from app.services.pdf_service import generate_pdf_report
-from app.database import reports_collection
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Request
+from app.database import reports_collection, previews_collection
 from app.auth import get_current_user
+from app.services.rate_limit import enforce_rate_limit, rate_limit_key
+from app.services.scheduler import apply_queue_headers
+from app.services.budget import analysis_http_error
+from app.responses import negotiated_response, wants_msgpack
 from fastapi.responses import Response
+from fastapi.concurrency import run_in_threadpool
 from bson import ObjectId
 import math
+from typing import Optional
 
 router = APIRouter()
 
+# NOTE: forensics (torch/whisper/librosa), pdf_service (matplotlib/reportlab) and the
+# numpy-backed scoring modules are imported inside the handlers that need them, so
+# instances that only serve /history or /auth never pay for them at startup.
+
 # --- HELPER: Fix NaN/Infinity for JSON ---
 def sanitize_json(data):
     """Recursively replace NaN/Infinity with 0 or None for valid JSON"""
@@ -25,11 +33,55 @@ def sanitize_json(data):
 
 @router.post("/detect")
 async def detect_audio(
+    request: Request,
+    response: Response,
     file: UploadFile = File(...), 
-    current_user: dict = Depends(get_current_user)
+    profile: Optional[str] = Form(None),
+    reuse_known: bool = Form(False),
+    current_user: dict = Depends(enforce_rate_limit)
 ):
-    # 1. Perform Analysis
-    analysis_result = await analyze_audio_forensics(file, file.filename)
+    from app.services.baselines import CHANNEL_PROFILES
+    from app.services.forensics import analyze_audio_forensics
+
+    if profile and profile not in CHANNEL_PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown profile. Use one of: {', '.join(CHANNEL_PROFILES)}")
+
+    # 1. Perform Analysis (queued fairly against every other caller)
+    from app.services.previews import PREVIEW_ARTIFACTS
+    from app.services.fingerprint import FINGERPRINT_LOOKUP, ANY_OWNER
+
+    # "reuse" returns the earlier verdict for a known clip without re-running the analysis
+    replay_check = ("reuse" if reuse_known else "flag") if FINGERPRINT_LOOKUP else None
+
+    ticket = {}
+    try:
+        analysis_result = await analyze_audio_forensics(
+            file, file.filename, profile,
+            user_key=rate_limit_key(current_user, request), role=current_user["role"], ticket=ticket,
+            # Guests have no stored report to hang a preview on
+            preview=PREVIEW_ARTIFACTS and current_user["role"] != "guest",
+            replay_check=replay_check,
+            reuse_owner=ANY_OWNER if current_user["role"] == "admin" else current_user["email"],
+            is_disconnected=request.is_disconnected,
+        )
+    except Exception as e:
+        # Failed analyses are reported as errors and never stored as reports
+        raise analysis_http_error(e)
+    apply_queue_headers(response, ticket)
+    raw_features = analysis_result.pop("raw_features", None)
+    preview_blob = analysis_result.pop("preview", None)
+    fingerprint = analysis_result.pop("fingerprint", None)
+
+    # Replays are flagged to everyone, but details of the earlier report (id, when it was
+    # uploaded, scores) only go to its owner or an admin
+    seen = analysis_result.get("metadata", {}).get("previously_seen")
+    if seen:
+        owner = seen.pop("user_email", None)
+        own_report = owner == current_user["email"]
+        if own_report or current_user["role"] == "admin":
+            seen["own_report"] = own_report
+        else:
+            analysis_result["metadata"]["previously_seen"] = {"verdict": seen["verdict"], "own_report": False}
     
     # 2. Add Timestamp & User Info
     from datetime import datetime
@@ -46,34 +98,154 @@ async def detect_audio(
         analysis_result["_id"] = None 
     else:
         analysis_result["can_download_pdf"] = True
-        # SAVE TO DB
-        new_record = reports_collection.insert_one(analysis_result.copy())
+        # SAVE TO DB (with the packed feature vector so it can be re-scored later)
+        record = analysis_result.copy()
+        if raw_features:
+            record["raw_features"] = raw_features
+        if fingerprint:
+            record["fingerprint"] = fingerprint
+        new_record = reports_collection.insert_one(record)
         analysis_result["_id"] = str(new_record.inserted_id)
+        if fingerprint:
+            from app.services.fingerprint import index_fingerprint
+            try:
+                await run_in_threadpool(index_fingerprint, new_record.inserted_id, fingerprint)
+            except Exception as e:
+                # The report keeps its fingerprint; a rebuild picks it up later
+                print(f"Fingerprint indexing failed: {e}")
+        analysis_result["has_preview"] = preview_blob is not None
+        if preview_blob:
+            from app.services.previews import preview_etag
+            previews_collection.insert_one({
+                "_id": new_record.inserted_id,
+                "blob": preview_blob,
+                "etag": preview_etag(preview_blob),
+            })
             
     return analysis_result
 
 @router.get("/history")
-async def get_history(current_user: dict = Depends(get_current_user)):
+async def get_history(request: Request, current_user: dict = Depends(get_current_user)):
     if current_user["role"] == "guest":
         return []
     
-    # Fetch records
-    cursor = reports_collection.find({"user_email": current_user["email"]}).sort("timestamp", -1)
-    results = []
-    
-    for doc in cursor:
-        doc["_id"] = str(doc["_id"])
-        # CRITICAL FIX: Sanitize old corrupt records on the fly
-        clean_doc = sanitize_json(doc)
-        results.append(clean_doc)
+    # Fetch records. Old corrupt records (NaN/Infinity) are made safe by the encoder,
+    # which writes them as null, so there's no per-document sanitize pass.
+    cursor = reports_collection.find(
+        {"user_email": current_user["email"]}, {"raw_features": 0, "fingerprint": 0}
+    ).sort("timestamp", -1)
+
+    return negotiated_response(request, list(cursor))
+
+@router.post("/rescore")
+async def rescore_stored_reports(current_user: dict = Depends(get_current_user)):
+    """Re-applies the current scoring model to every stored report (no audio needed)"""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can rescore reports")
+
+    from app.services.feature_store import rescore_reports
+
+    return await run_in_threadpool(rescore_reports, reports_collection)
+
+@router.post("/fingerprints/rebuild")
+async def rebuild_fingerprint_index(current_user: dict = Depends(get_current_user)):
+    """Rebuilds the replay-detection index from the fingerprints stored on reports"""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can rebuild the index")
+
+    from app.services.fingerprint import rebuild_index
+
+    return await run_in_threadpool(rebuild_index, reports_collection)
+
+@router.post("/report/{report_id}/confirm-human")
+async def confirm_human(report_id: str, current_user: dict = Depends(get_current_user)):
+    """Feeds a verified human recording into its channel profile's baseline"""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can confirm samples")
 
-    return results
+    from app.services.feature_store import unpack_columns
+    from app.services.baselines import record_human_sample, DEFAULT_PROFILE
+
+    try:
+        report = reports_collection.find_one({"_id": ObjectId(report_id)})
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid Request")
+
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found")
+    if report.get("confirmed_human"):
+        return {"message": "Report already confirmed"}
+
+    raw = report.get("raw_features")
+    if not raw or "vector" not in raw:
+        raise HTTPException(status_code=422, detail="Report has no stored feature vector")
+
+    cols = unpack_columns([raw["vector"]], raw.get("schema", 1))
+    features = {name: float(values[0]) for name, values in cols.items()}
+    metadata = report.get("metadata", {})
+    profile = metadata.get("channel_profile") or DEFAULT_PROFILE
+    # Older reports could pair the telephony profile with wideband features (reports
+    # without an analysis_mode predate narrowband analysis, so they are all wideband)
+    if profile == "telephony" and metadata.get("analysis_mode", "wideband") != "narrowband":
+        raise HTTPException(status_code=422, detail="Wideband report can't feed the telephony baseline")
+
+    # Claim the report before touching the baseline, so concurrent confirms can't both
+    # fold the same sample into the accumulators
+    claimed = reports_collection.find_one_and_update(
+        {"_id": report["_id"], "confirmed_human": {"$ne": True}},
+        {"$set": {"confirmed_human": True}},
+    )
+    if not claimed:
+        return {"message": "Report already confirmed"}
+    try:
+        await run_in_threadpool(record_human_sample, profile, features)
+    except Exception:
+        reports_collection.update_one({"_id": report["_id"]}, {"$unset": {"confirmed_human": ""}})
+        raise
+    return {"message": "Sample added to baseline", "profile": profile}
+
+@router.get("/report/{report_id}/preview")
+async def get_report_preview(report_id: str, request: Request, current_user: dict = Depends(get_current_user)):
+    """Waveform envelope, log-mel image and f0 contour for a stored report"""
+    if current_user["role"] == "guest":
+        raise HTTPException(status_code=403, detail="Guests have no stored previews")
+
+    try:
+        oid = ObjectId(report_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid Request")
+
+    report = reports_collection.find_one({"_id": oid}, {"user_email": 1})
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found")
+    if report["user_email"] != current_user["email"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    # Previews never change for a report, so a matching ETag skips the blob fetch entirely
+    cached = previews_collection.find_one({"_id": oid}, {"etag": 1})
+    if not cached:
+        raise HTTPException(status_code=404, detail="No preview for this report")
+
+    cache_headers = {"ETag": cached["etag"], "Cache-Control": "private, max-age=31536000, immutable"}
+    if cached["etag"] in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=cache_headers)
+
+    blob = previews_collection.find_one({"_id": oid}, {"blob": 1})["blob"]
+    if wants_msgpack(request):
+        response = Response(content=blob, media_type="application/msgpack", headers=cache_headers)
+    else:
+        from app.services.previews import preview_to_json
+        response = negotiated_response(request, preview_to_json(blob), headers=cache_headers)
+    response.headers["Vary"] = "Accept"
+    return response
 
 @router.get("/report/{report_id}/download")
 async def download_report(report_id: str, current_user: dict = Depends(get_current_user)):
     if current_user["role"] == "guest":
         raise HTTPException(status_code=403, detail="Guests cannot download reports")
 
+    from app.services.pdf_service import generate_pdf_report
+
     try:
         # Get report
         report = reports_collection.find_one({"_id": ObjectId(report_id)})
@@ -128,6 +300,9 @@ async def delete_report(report_id: str, current_user: dict = Depends(get_current
             raise HTTPException(status_code=403, detail="Not authorized")
 
         result = reports_collection.delete_one({"_id": ObjectId(report_id)})
+        previews_collection.delete_one({"_id": ObjectId(report_id)})
+        from app.services.fingerprint import remove_fingerprint
+        remove_fingerprint(ObjectId(report_id))
         if result.deleted_count == 1:
             return {"message": "Report deleted successfully"}
         else:
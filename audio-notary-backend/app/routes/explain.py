@@ -1,6 +1,5 @@
 from fastapi import APIRouter, HTTPException
 from fastapi.concurrency import run_in_threadpool
-import google.generativeai as genai
 import os
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
@@ -9,8 +8,17 @@ import time
 router = APIRouter()
 
 GEMINI_KEY = os.getenv("GEMINI_API_KEY") 
-if GEMINI_KEY:
-    genai.configure(api_key=GEMINI_KEY)
+
+# google.generativeai (grpc + protobuf) is imported on the first chat, not at startup
+_genai = None
+
+def get_genai():
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=GEMINI_KEY)
+        _genai = genai
+    return _genai
 
 class ChatRequest(BaseModel):
     message: str
@@ -25,6 +33,7 @@ def _generate_sync(prompt):
         "models/gemini-pro"
     ]
     
+    genai = get_genai()
     last_error = None
 
     for model_name in models_to_try:
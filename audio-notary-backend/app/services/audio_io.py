@@ -0,0 +1,188 @@
+import io
+import os
+import re
+import time
+import uuid
+import shutil
+import logging
+import tempfile
+import subprocess
+
+from fastapi.concurrency import run_in_threadpool
+from starlette.formparsers import MultiPartParser
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# UPLOAD STORAGE
+# ------------------------------
+# Typical voice notes are decoded straight from memory. Only uploads above the limit are
+# spilled to a dedicated scratch directory, which is swept for orphans on startup.
+INMEMORY_MAX_BYTES = int(os.getenv("INMEMORY_UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+SCRATCH_DIR = os.getenv("SCRATCH_DIR", os.path.join(tempfile.gettempdir(), "verivox_scratch"))
+SCRATCH_MAX_AGE_SECONDS = int(os.getenv("SCRATCH_MAX_AGE_SECONDS", "3600"))
+
+COPY_CHUNK_BYTES = 1024 * 1024
+
+# Starlette's multipart parser spools file parts to an OS tempfile past 1 MB, before a
+# route ever sees them. Raise that to our own limit so clips below it stay in memory.
+MultiPartParser.spool_max_size = max(MultiPartParser.spool_max_size, INMEMORY_MAX_BYTES)
+
+class AudioDecodeError(ValueError):
+    """The upload isn't audio we can read (or ffmpeg took longer than its budget)"""
+
+def _scratch_path(ext):
+    os.makedirs(SCRATCH_DIR, exist_ok=True)
+    return os.path.join(SCRATCH_DIR, f"upload_{uuid.uuid4().hex}{ext}")
+
+def cleanup_scratch_dir(max_age=SCRATCH_MAX_AGE_SECONDS):
+    """Deletes scratch files left behind by crashed workers"""
+    if not os.path.isdir(SCRATCH_DIR):
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age
+    for entry in os.scandir(SCRATCH_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            pass
+    if removed:
+        logger.info(f"Removed {removed} orphaned scratch files from {SCRATCH_DIR}")
+    return removed
+
+class AudioSource:
+    """An uploaded clip, held either as in-memory bytes or as a scratch file"""
+
+    def __init__(self, data=None, path=None, ext="", owns_path=False):
+        self.data = data
+        self.path = path
+        self.ext = (ext or "").lower()
+        self.owns_path = owns_path
+        # Length of the whole recording (not just the decoded part), once decode() has
+        # run and the container reported it
+        self.full_duration = None
+
+    @classmethod
+    def from_path(cls, path):
+        return cls(path=path, ext=os.path.splitext(path)[1])
+
+    def decode(self, duration=None, timeout=None):
+        """
+        Returns (mono float32 samples, native sample rate), truncated to `duration` seconds.
+        `timeout` bounds the ffmpeg pipe decode; raises AudioDecodeError on unreadable input.
+        """
+        y, sr, self.full_duration = self._decode(duration, timeout)
+        if y is None or len(y) == 0 or not sr:
+            raise AudioDecodeError("Decoded audio is empty")
+        return y, sr
+
+    def _decode(self, duration, timeout):
+        if self.data is not None:
+            try:
+                return _decode_soundfile(io.BytesIO(self.data), duration)
+            except Exception:
+                pass
+            try:
+                return _decode_ffmpeg_pipe(self.data, duration, timeout)
+            except subprocess.TimeoutExpired:
+                # A pathological file: don't spend the same budget again on the fallbacks
+                raise AudioDecodeError(f"ffmpeg decode exceeded {timeout}s")
+            except Exception as e:
+                # Containers that need seeking (e.g. MP4 with a trailing moov atom) can't
+                # be read from a pipe, so fall back to a scratch file for this one upload
+                logger.info(f"Pipe decode failed ({e}); spilling upload to scratch.")
+                self.spill()
+
+        try:
+            return _decode_soundfile(self.path, duration)
+        except Exception:
+            import librosa
+            try:
+                y, sr = librosa.load(self.path, sr=None, mono=True, duration=duration)
+            except Exception as e:
+                raise AudioDecodeError(f"Unreadable audio: {e}") from e
+            try:
+                full_duration = librosa.get_duration(path=self.path)
+            except Exception:
+                full_duration = None
+            return y, sr, full_duration
+
+    def spill(self):
+        """Moves in-memory bytes to a scratch file"""
+        if self.data is None:
+            return
+        self.path = _scratch_path(self.ext or ".tmp")
+        self.owns_path = True
+        with open(self.path, "wb") as f:
+            f.write(self.data)
+        self.data = None
+
+    def close(self):
+        self.data = None
+        if self.owns_path and self.path and os.path.exists(self.path):
+            try: os.remove(self.path)
+            except OSError: pass
+
+# numpy/soundfile are imported inside the decoders so that importing this module (for
+# the startup scratch sweep) stays cheap
+
+def _decode_soundfile(file, duration):
+    import numpy as np
+    import soundfile as sf
+
+    with sf.SoundFile(file) as snd:
+        frames = int(duration * snd.samplerate) if duration else -1
+        y = snd.read(frames=frames, dtype="float32", always_2d=True)
+        sr = snd.samplerate
+        full_duration = snd.frames / sr if snd.frames > 0 else None
+    return np.mean(y, axis=1) if y.shape[1] > 1 else y[:, 0], sr, full_duration
+
+_FFMPEG_RATE = re.compile(r"Audio:.*?(\d+) Hz")
+# Missing ("Duration: N/A") when the container has no length the pipe can read up front
+_FFMPEG_DURATION = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+
+def _decode_ffmpeg_pipe(data, duration, timeout=None):
+    import numpy as np
+
+    cmd = ["ffmpeg", "-nostdin", "-hide_banner", "-i", "pipe:0"]
+    if duration:
+        cmd += ["-t", str(duration)]
+    cmd += ["-ac", "1", "-f", "f32le", "pipe:1"]
+    proc = subprocess.run(cmd, input=data, capture_output=True, check=True, timeout=timeout)
+
+    log = proc.stderr.decode("utf-8", "ignore")
+    match = _FFMPEG_RATE.search(log)
+    if not match or not proc.stdout:
+        raise ValueError("ffmpeg produced no audio")
+    length = _FFMPEG_DURATION.search(log)
+    full_duration = None
+    if length:
+        hours, minutes, seconds = length.groups()
+        full_duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    return np.frombuffer(proc.stdout, dtype=np.float32), int(match.group(1)), full_duration
+
+# ------------------------------
+# ASYNC RECEIVE
+# ------------------------------
+def _copy_to_scratch(file_obj, ext):
+    path = _scratch_path(ext)
+    file_obj.seek(0)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(file_obj, out, COPY_CHUNK_BYTES)
+    return path
+
+async def receive_upload(file_upload, filename):
+    """Reads an UploadFile into an AudioSource, keeping small clips off the disk entirely"""
+    ext = os.path.splitext(filename or "")[1] or ".tmp"
+
+    if file_upload.size is not None and file_upload.size > INMEMORY_MAX_BYTES:
+        path = await run_in_threadpool(_copy_to_scratch, file_upload.file, ext)
+        return AudioSource(path=path, ext=ext, owns_path=True)
+
+    data = await file_upload.read()
+    source = AudioSource(data=data, ext=ext)
+    if len(data) > INMEMORY_MAX_BYTES:
+        await run_in_threadpool(source.spill)
+    return source
@@ -0,0 +1,137 @@
+import os
+import time
+import math
+import logging
+import threading
+
+from app.database import baselines_collection
+from app.services.scoring import HUMAN_BASELINE, NARROWBAND_BASELINE
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# CHANNEL PROFILES
+# ------------------------------
+# Telephony, studio and mobile recordings have very different jitter/entropy
+# distributions, so each gets its own baseline learned from confirmed-human samples.
+# Until a profile has enough samples for a feature, its built-in default is used.
+DEFAULT_PROFILE = "default"
+CHANNEL_PROFILES = ("telephony", "studio", "mobile", DEFAULT_PROFILE)
+
+# Built-in starting point per profile, before any samples are learned
+PROFILE_DEFAULTS = {"telephony": NARROWBAND_BASELINE}
+
+MIN_PROFILE_SAMPLES = int(os.getenv("BASELINE_MIN_SAMPLES", "30"))
+SNAPSHOT_TTL_SECONDS = int(os.getenv("BASELINE_REFRESH_SECONDS", "300"))
+
+MOBILE_CODECS = {".m4a", ".aac", ".amr", ".3gp", ".opus", ".ogg", ".webm", ".caf"}
+STUDIO_CODECS = {".wav", ".flac", ".aif", ".aiff"}
+
+def select_profile(sample_rate=None, codec=None, duration=None, requested=None):
+    """Picks a channel profile from the request parameter, or else from the audio metadata"""
+    if requested in CHANNEL_PROFILES:
+        return requested
+
+    codec = (codec or "").lower()
+    if sample_rate and sample_rate <= 8000:
+        return "telephony"
+    if codec in MOBILE_CODECS or (sample_rate and sample_rate <= 16000):
+        return "mobile"
+    if codec in STUDIO_CODECS and sample_rate and sample_rate >= 44100:
+        return "studio"
+    if codec == ".mp3" and duration and duration > 300:
+        # Long, full-band MP3s are almost always podcast exports
+        return "studio"
+    return DEFAULT_PROFILE
+
+# ------------------------------
+# STREAMING (WELFORD) ACCUMULATORS
+# ------------------------------
+def _welford_stages(feature, value):
+    """Aggregation-pipeline update that folds one sample into {n, mean, m2} atomically"""
+    key = f"features.{feature}"
+    n, mean, m2 = f"${key}.n", f"${key}.mean", f"${key}.m2"
+    return [
+        {"$set": {
+            f"{key}.n": {"$add": [{"$ifNull": [n, 0]}, 1]},
+            f"{key}.delta": {"$subtract": [value, {"$ifNull": [mean, 0]}]},
+        }},
+        {"$set": {
+            f"{key}.mean": {"$add": [{"$ifNull": [mean, 0]}, {"$divide": [f"${key}.delta", n]}]},
+        }},
+        {"$set": {
+            f"{key}.m2": {"$add": [
+                {"$ifNull": [m2, 0]},
+                {"$multiply": [f"${key}.delta", {"$subtract": [value, mean]}]},
+            ]},
+        }},
+        {"$unset": f"{key}.delta"},
+    ]
+
+def record_human_sample(profile, features):
+    """Adds a confirmed-human sample's features to the profile's running mean/variance"""
+    stages = []
+    for name in HUMAN_BASELINE:
+        value = features.get(name)
+        if value is None or not math.isfinite(value):
+            continue
+        stages.extend(_welford_stages(name, float(value)))
+
+    if not stages:
+        return
+    stages.append({"$set": {"updated_at": "$$NOW"}})
+    baselines_collection.update_one({"_id": profile}, stages, upsert=True)
+
+# ------------------------------
+# IN-MEMORY SNAPSHOT
+# ------------------------------
+class BaselineSnapshot:
+    """
+    Cached view of every profile's baseline. Scoring reads from memory; the snapshot
+    reloads from Mongo at most once per TTL instead of querying per request.
+    """
+
+    def __init__(self, ttl=SNAPSHOT_TTL_SECONDS):
+        self.ttl = ttl
+        self._profiles = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        profiles = {}
+        try:
+            for doc in baselines_collection.find({}):
+                learned = {}
+                for name, acc in doc.get("features", {}).items():
+                    n = acc.get("n", 0)
+                    if name in HUMAN_BASELINE and n >= MIN_PROFILE_SAMPLES:
+                        learned[name] = (acc["mean"], math.sqrt(acc["m2"] / (n - 1)))
+                profiles[doc["_id"]] = learned
+        except Exception as e:
+            logger.error(f"Baseline refresh failed, keeping previous snapshot: {e}")
+            return
+        self._profiles = profiles
+        logger.info(f"Baseline snapshot refreshed ({len(profiles)} profiles).")
+
+    def _is_stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl
+
+    def refresh(self, force=False):
+        if not force and not self._is_stale():
+            return
+        with self._lock:
+            if force or self._is_stale():
+                self._load()
+                self._loaded_at = time.monotonic()
+
+    def get(self, profile):
+        """Baseline (mean, std) per feature for a profile, falling back to its defaults"""
+        self.refresh()
+        baseline = dict(PROFILE_DEFAULTS.get(profile, HUMAN_BASELINE))
+        baseline.update(self._profiles.get(profile, {}))
+        return baseline
+
+baseline_snapshot = BaselineSnapshot()
+
+def get_baseline(profile):
+    return baseline_snapshot.get(profile or DEFAULT_PROFILE)
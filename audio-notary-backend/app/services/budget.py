@@ -0,0 +1,126 @@
+import os
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+
+from app.services.audio_io import AudioDecodeError
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# ANALYSIS TIME BUDGETS
+# ------------------------------
+# Every analysis carries a budget: an overall deadline (counted from when the analysis
+# is requested, so time spent queued is spent budget) plus a cap per stage. The worker checks
+# it between stages and between pitch chunks, which is also how a client disconnect
+# reaches a job that is already running in the threadpool. Expensive stages are only
+# started when their estimated cost fits; otherwise they are degraded, not timed out.
+ANALYSIS_DEADLINE_SECONDS = float(os.getenv("ANALYSIS_DEADLINE_SECONDS", "120"))
+STAGE_BUDGET_SECONDS = {
+    "decode": float(os.getenv("DECODE_BUDGET_SECONDS", "30")),
+    "acoustic": 30.0,
+    "pitch": float(os.getenv("PITCH_BUDGET_SECONDS", "40")),
+    "whisper": float(os.getenv("WHISPER_BUDGET_SECONDS", "60")),
+}
+
+# Seconds of work per second of audio. These are only starting points: each finished
+# stage folds its measured cost in, so the estimates track the actual host.
+STAGE_COST_PER_AUDIO_SECOND = {
+    "acoustic": 0.05,
+    "pitch": 0.6,
+    "pitch_fast": 0.05,
+    "whisper": 0.5,
+}
+COST_SMOOTHING = 0.2
+DISCONNECT_POLL_SECONDS = 0.5
+DEADLINE_RETRY_AFTER_SECONDS = 30
+
+_observed_costs = dict(STAGE_COST_PER_AUDIO_SECOND)
+
+def estimated_cost(stage, audio_seconds):
+    return _observed_costs.get(stage, 0.0) * audio_seconds
+
+def record_cost(stage, elapsed, audio_seconds):
+    if audio_seconds <= 0:
+        return
+    # Exponential moving average; races between workers only lose an update
+    per_second = elapsed / audio_seconds
+    previous = _observed_costs.setdefault(stage, per_second)
+    _observed_costs[stage] = previous + COST_SMOOTHING * (per_second - previous)
+
+class AnalysisCancelled(Exception):
+    """Raised at a checkpoint once the client is gone ("disconnected") or the deadline passed"""
+    def __init__(self, reason, stage=None):
+        super().__init__(f"Analysis cancelled ({reason}) at stage '{stage}'")
+        self.reason = reason
+        self.stage = stage
+
+class AnalysisBudget:
+    def __init__(self, deadline_seconds=ANALYSIS_DEADLINE_SECONDS, started=None):
+        self.started = time.monotonic() if started is None else started
+        self.deadline = self.started + deadline_seconds
+        self.cancelled = None
+        # stage -> {"mode": ..., "reason": "load" | "budget" | "error"}
+        self.degraded = {}
+
+    def cancel(self, reason):
+        """Thread-safe: the worker only ever reads the flag"""
+        self.cancelled = reason
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+    def check(self, stage, deadline=True):
+        """Raises if cancelled; with deadline=False, work already done is still returned late"""
+        if self.cancelled:
+            raise AnalysisCancelled(self.cancelled, stage)
+        if deadline and self.remaining() <= 0:
+            raise AnalysisCancelled("deadline", stage)
+
+    def allowance(self, stage):
+        """Seconds this stage may still use: its own cap, or whatever is left overall"""
+        return min(STAGE_BUDGET_SECONDS.get(stage, float("inf")), self.remaining())
+
+    def can_afford(self, stage, audio_seconds, cost_key=None):
+        return estimated_cost(cost_key or stage, audio_seconds) <= self.allowance(stage)
+
+    def degrade(self, stage, mode, reason):
+        self.degraded[stage] = {"mode": mode, "reason": reason}
+        logger.info(f"Degraded stage '{stage}' to '{mode}' ({reason}).")
+
+    @contextmanager
+    def stage(self, name, audio_seconds=0.0, cost_key=None):
+        """Checks the budget on entry (and for a disconnect on exit), and learns the stage's cost"""
+        self.check(name)
+        start = time.monotonic()
+        yield
+        record_cost(cost_key or name, time.monotonic() - start, audio_seconds)
+        self.check(name, deadline=False)
+
+async def watch_disconnect(is_disconnected, budget):
+    """Polls the request until it disconnects, then cancels the budget (run as a task)"""
+    while True:
+        if await is_disconnected():
+            budget.cancel("disconnected")
+            return
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+def analysis_http_error(e):
+    """Maps an analysis failure to the HTTP error the client should see"""
+    if isinstance(e, AnalysisCancelled):
+        if e.reason == "disconnected":
+            # Nobody is listening; nginx's "client closed request" keeps it out of 5xx stats
+            return HTTPException(status_code=499, detail="Client closed request")
+        return HTTPException(
+            status_code=503,
+            detail="Server is busy and the analysis ran out of time. Please try again.",
+            headers={"Retry-After": str(DEADLINE_RETRY_AFTER_SECONDS)},
+        )
+    if isinstance(e, AudioDecodeError):
+        return HTTPException(status_code=422, detail="Could not decode the audio file.")
+    if isinstance(e, HTTPException):
+        return e
+    return HTTPException(status_code=500, detail="Analysis failed. Please try again.")
@@ -0,0 +1,97 @@
+import librosa
+import numpy as np
+from scipy.spatial.distance import cosine
+import logging
+
+# Re-use your existing highly accurate AI detection logic!
+from app.services.forensics import _analyze_sync
+from app.services.audio_io import AudioDecodeError
+from app.services.budget import AnalysisCancelled
+
+logger = logging.getLogger(__name__)
+
+def get_biometric_signature(source):
+    """Extracts a hyper-strict mathematical fingerprint using Pitch & MFCC"""
+    y, native_sr = source.decode(duration=30)
+    sr = 22050
+    if native_sr != sr:
+        y = librosa.resample(y, orig_sr=native_sr, target_sr=sr)
+    
+    # Trim silence so we only compare actual spoken words
+    y_trimmed, _ = librosa.effects.trim(y, top_db=25)
+    if len(y_trimmed) > sr * 1: y = y_trimmed
+    
+    # 1. Vocal Pitch/Brightness (Spectral Centroid) - Highly unique to individuals
+    centroid = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr))
+    
+    # 2. Throat Shape (MFCCs)
+    mfccs = np.mean(librosa.feature.mfcc(y=y, sr=sr, n_mfcc=21)[1:], axis=1)
+    
+    return centroid, mfccs
+
+def _compare_sync(source1, source2, budget=None):
+    try:
+        # 1. Run AI Detection on both files
+        res1 = _analyze_sync(source1, budget=budget)
+        if budget:
+            # Both files share the deadline, but each reports only its own degraded stages
+            budget.degraded = {}
+        res2 = _analyze_sync(source2, budget=budget)
+        for res in (res1, res2):
+            res.pop("raw_features", None)
+            res.pop("preview", None)
+            res.pop("fingerprint", None)
+
+        # 2. Extract Strict Voice Biometrics
+        if budget:
+            budget.check("biometrics")
+        cent1, mfcc1 = get_biometric_signature(source1)
+        cent2, mfcc2 = get_biometric_signature(source2)
+
+        # 3. Evaluate Pitch Difference (Different people have different vocal frequencies)
+        cent_diff = abs(cent1 - cent2)
+        pitch_match = max(0.1, 100 - (cent_diff / 5)) 
+        
+        # 4. Evaluate Throat Shape Match
+        mfcc_sim = 1 - cosine(mfcc1, mfcc2)
+        mfcc_match = max(0.1, (mfcc_sim - 0.85) * 666) 
+        
+        # Combine the physical metrics
+        match_score = (pitch_match * 0.5) + (mfcc_match * 0.5)
+        
+        # --- THE LOGIC YOU REQUESTED ---
+        # If the AI Confidence scores are vastly different (e.g. one is 90% AI, the other is 10% AI),
+        # heavily penalize the match score because they are clearly different profiles.
+        conf_diff = abs(res1["confidence_score"] - res2["confidence_score"])
+        if conf_diff > 15:
+            match_score -= (conf_diff * 1.5)
+
+        # Ensure score stays between 0 and 100
+        match_score = min(99.9, max(0.1, match_score))
+
+        # 5. Generate Verdicts
+        is_same_speaker = match_score >= 70.0
+        is_clone_attack = False
+
+        if is_same_speaker:
+            if res1["verdict"] != res2["verdict"]:
+                is_clone_attack = True 
+                conclusion = "VOICE CLONING ATTACK DETECTED"
+            else:
+                conclusion = "SAME SPEAKER DETECTED"
+        else:
+            conclusion = "DIFFERENT SPEAKERS DETECTED"
+
+        return {
+            "file1": res1,
+            "file2": res2,
+            "similarity_score": float(round(match_score, 1)),
+            "conclusion": conclusion,
+            "is_clone_attack": is_clone_attack
+        }
+    except (AnalysisCancelled, AudioDecodeError):
+        # The route turns these into 499/503/422 instead of a blanket 500
+        raise
+    except Exception as e:
+        logger.error(f"Compare Error: {e}")
+        raise Exception("Failed to compare audio streams.")
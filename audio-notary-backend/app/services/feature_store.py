@@ -0,0 +1,130 @@
+import numpy as np
+import logging
+from datetime import datetime
+from pymongo import UpdateOne
+
+from app.services.scoring import score_features, build_reasons, verdict_label
+from app.services.baselines import get_baseline, DEFAULT_PROFILE
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# STORED FEATURE SCHEMA
+# ------------------------------
+# Every report keeps its full-precision feature vector as a packed float64 blob in this
+# column order, so re-scoring never needs the original audio. Bump the version (and keep
+# the old tuple) whenever columns are added.
+FEATURE_SCHEMA_VERSION = 1
+FEATURE_COLUMNS = {
+    1: (
+        "pitch_jitter",
+        "cepstral_peak",
+        "spectral_entropy",
+        "silence_ratio",
+        "mfcc_consistency",
+        "mfcc_time_var",
+        "energy_var",
+        "whisper_logprob_std",
+        "duration",
+    ),
+}
+
+RESCORE_BATCH_SIZE = 5000
+
+def pack_features(raw, whisper_logprobs=None, mfcc=None):
+    """Builds the compact `raw_features` sub-document stored alongside a report"""
+    columns = FEATURE_COLUMNS[FEATURE_SCHEMA_VERSION]
+    vector = np.array([raw.get(name, np.nan) for name in columns], dtype=np.float64)
+
+    packed = {
+        "schema": FEATURE_SCHEMA_VERSION,
+        "vector": vector.tobytes(),
+        "whisper_logprobs": np.asarray(whisper_logprobs or [], dtype=np.float32).tobytes(),
+    }
+    if mfcc is not None:
+        # Per-coefficient mean & std, stacked as [means..., stds...]
+        stats = np.concatenate([np.mean(mfcc, axis=1), np.std(mfcc, axis=1)])
+        packed["mfcc_stats"] = stats.astype(np.float32).tobytes()
+    return packed
+
+def unpack_columns(blobs, schema=FEATURE_SCHEMA_VERSION):
+    """Stacks packed vectors into a dict of column arrays (one entry per blob)"""
+    columns = FEATURE_COLUMNS[schema]
+    matrix = np.frombuffer(b"".join(blobs), dtype=np.float64).reshape(-1, len(columns))
+    return {name: matrix[:, i] for i, name in enumerate(columns)}
+
+def rescore_columns(cols, baseline=None):
+    """Re-runs the scoring model over stored columns and returns the fields to $set per row"""
+    scored = score_features(cols, baseline=baseline)
+    updates = []
+    for i in range(len(scored["is_human"])):
+        verdict = verdict_label(scored["is_human"][i])
+        updates.append({
+            "verdict": verdict,
+            "confidence_score": float(round(scored["normalized_fake"][i], 2)),
+            "human_alignment_score": float(round(scored["normalized_human"][i], 2)),
+            "reasons": build_reasons(
+                verdict,
+                scored["whisper_boost"][i],
+                cols["pitch_jitter"][i],
+                cols["mfcc_time_var"][i],
+                cols["energy_var"][i],
+            ),
+        })
+    return updates
+
+def _flush(collection, docs, schema, profile, stats):
+    cols = unpack_columns([d["raw_features"]["vector"] for d in docs], schema)
+    ops = []
+    now = datetime.utcnow()
+    for doc, fields in zip(docs, rescore_columns(cols, get_baseline(profile))):
+        # Only write back rows whose outcome actually moved
+        if all(doc.get(k) == v for k, v in fields.items()):
+            continue
+        fields["rescored_at"] = now
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+
+    stats["scanned"] += len(docs)
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+        stats["updated"] += len(ops)
+
+def rescore_reports(collection, query=None, batch_size=RESCORE_BATCH_SIZE):
+    """
+    Recomputes verdicts for every stored report that has a feature vector, in vectorized
+    batches, and writes changes back with unordered bulk updates. No audio is touched.
+    """
+    query = dict(query or {})
+    query["raw_features.vector"] = {"$exists": True}
+    projection = {
+        "raw_features.schema": 1, "raw_features.vector": 1, "metadata.channel_profile": 1,
+        "verdict": 1, "confidence_score": 1, "human_alignment_score": 1, "reasons": 1,
+    }
+
+    stats = {"scanned": 0, "updated": 0}
+    pending = {}
+
+    for doc in collection.find(query, projection, batch_size=batch_size):
+        schema = doc["raw_features"].get("schema", FEATURE_SCHEMA_VERSION)
+        if schema not in FEATURE_COLUMNS:
+            continue
+        # Batches are grouped per schema and channel profile so each shares one baseline
+        profile = doc.get("metadata", {}).get("channel_profile") or DEFAULT_PROFILE
+        key = (schema, profile)
+        bucket = pending.setdefault(key, [])
+        bucket.append(doc)
+        if len(bucket) >= batch_size:
+            _flush(collection, bucket, schema, profile, stats)
+            pending[key] = []
+
+    for (schema, profile), bucket in pending.items():
+        if bucket:
+            _flush(collection, bucket, schema, profile, stats)
+
+    logger.info(f"Rescore finished: {stats['updated']} of {stats['scanned']} reports changed.")
+    return stats
+
+if __name__ == "__main__":
+    # Usage: python -m app.services.feature_store
+    from app.database import reports_collection
+    print(rescore_reports(reports_collection))
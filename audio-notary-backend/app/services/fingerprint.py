@@ -0,0 +1,258 @@
+import os
+import logging
+
+import numpy as np
+from scipy.ndimage import maximum_filter
+from bson import ObjectId
+from pymongo import ASCENDING
+
+from app.database import reports_collection, fingerprints_collection
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# ACOUSTIC FINGERPRINTS (REPLAY DETECTION)
+# ------------------------------
+# Landmark hashes: spectral peaks from the analysis STFT, paired with a few peaks that
+# follow them. Each pair hashes (f1, f2, dt) into 25 bits, which survives gain changes
+# (peaks are picked relative to their neighbours), re-encoding (the strong peaks stay
+# put) and trimming (matches are voted on a consistent time offset, not absolute time).
+# Peaks are picked in Hz/seconds on a fixed grid below 4 kHz, so a wideband clip and its
+# telephone-rate re-encode still share a (smaller) set of aligned hashes.
+FINGERPRINT_VERSION = 1
+FP_FMIN = 250.0
+FP_FMAX = 4000.0
+FREQ_STEP_HZ = 8.0          # 9 bits for f1 and f2
+TIME_STEP_S = 0.016         # 7 bits for dt (up to ~2 s)
+MAX_DT_STEPS = 127
+MAX_DF_STEPS = 96
+PEAK_SPREAD_HZ = 120.0
+PEAK_SPREAD_S = 0.15
+PEAK_RANGE_DB = 60.0
+PEAKS_PER_SECOND = 8
+FAN_OUT = 3
+PAIR_SEARCH = 24
+
+# A 45 s clip yields at most ~1,100 hashes, so a million stored clips is on the order of
+# a billion postings of {h, r, t}. The (h, r, t) index makes lookups covered queries:
+# one $in over the query's hashes, then offset voting in numpy.
+FINGERPRINT_LOOKUP = os.getenv("FINGERPRINT_LOOKUP", "1") == "1"
+MATCH_MIN_HASHES = int(os.getenv("FINGERPRINT_MIN_HASHES", "20"))
+MATCH_MIN_RATIO = 0.03
+# Reusing another report's verdict needs a much stronger match than just flagging it
+REUSE_MIN_RATIO = float(os.getenv("FINGERPRINT_REUSE_RATIO", "0.25"))
+# reuse_owner value that may reuse anyone's report (admins); everyone else only their own
+ANY_OWNER = "*"
+OFFSET_TOLERANCE_STEPS = 2
+MAX_CANDIDATE_POSTINGS = 500000
+MATCH_CANDIDATES = 3
+INDEX_BATCH_SIZE = 20000
+
+def _pick_peaks(S, sr, hop):
+    freqs = np.linspace(0, sr / 2, S.shape[0])
+    band = np.flatnonzero((freqs >= FP_FMIN) & (freqs <= FP_FMAX))
+    if band.size == 0 or S.shape[1] == 0:
+        return np.empty(0), np.empty(0)
+
+    log_S = np.log(S[band] + 1e-6)
+    bin_hz = freqs[1] - freqs[0]
+    frame_s = hop / sr
+    size = (max(3, int(round(PEAK_SPREAD_HZ / bin_hz))), max(3, int(round(PEAK_SPREAD_S / frame_s))))
+    # log_S is in nepers: PEAK_RANGE_DB below the loudest bin (and never digital silence)
+    floor = max(log_S.max() - PEAK_RANGE_DB / 8.686, np.log(1e-4))
+    fi, ti = np.nonzero((maximum_filter(log_S, size=size) == log_S) & (log_S > floor))
+    if fi.size == 0:
+        return np.empty(0), np.empty(0)
+
+    # Strongest PEAKS_PER_SECOND peaks in every second, so loud passages can't crowd out
+    # the rest of the clip (and a trimmed copy keeps the same per-second picks)
+    second = (ti * frame_s).astype(np.int64)
+    order = np.lexsort((-log_S[fi, ti], second))
+    second = second[order]
+    rank = np.arange(order.size) - np.searchsorted(second, second, side="left")
+    keep = order[rank < PEAKS_PER_SECOND]
+    return freqs[band][fi[keep]], ti[keep] * frame_s
+
+def landmark_hashes(S, sr, hop):
+    """
+    Fingerprint of a magnitude STFT: (hashes uint32, anchor offsets uint16) in TIME_STEP_S
+    units. Hashes repeat; the offset of each anchor is what the match votes on.
+    """
+    peak_hz, peak_s = _pick_peaks(S, sr, hop)
+    fq = np.minimum(np.round(peak_hz / FREQ_STEP_HZ), 511).astype(np.int64)
+    tq = np.round(peak_s / TIME_STEP_S).astype(np.int64)
+    order = np.lexsort((fq, tq))
+    fq, tq = fq[order], tq[order]
+
+    hashes, offsets = [], []
+    taken = np.zeros(fq.size, dtype=np.int64)
+    # Nearest targets first: step k pairs every anchor with the k-th peak after it
+    for k in range(1, min(PAIR_SEARCH, fq.size)):
+        anchor = np.arange(fq.size - k)
+        dt = tq[k:] - tq[:-k]
+        df = fq[k:] - fq[:-k]
+        ok = (taken[anchor] < FAN_OUT) & (dt >= 1) & (dt <= MAX_DT_STEPS) & (np.abs(df) <= MAX_DF_STEPS)
+        anchor = anchor[ok]
+        taken[anchor] += 1
+        hashes.append((fq[anchor] << 16) | (fq[anchor + k] << 7) | dt[ok])
+        offsets.append(tq[anchor])
+
+    if not hashes:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint16)
+    return (
+        np.concatenate(hashes).astype(np.uint32),
+        np.minimum(np.concatenate(offsets), 65535).astype(np.uint16),
+    )
+
+def pack_fingerprint(hashes, offsets):
+    """Stored on the report itself, so the inverted index can always be rebuilt"""
+    return {"v": FINGERPRINT_VERSION, "hashes": hashes.tobytes(), "offsets": offsets.tobytes()}
+
+def unpack_fingerprint(packed):
+    return (
+        np.frombuffer(packed["hashes"], dtype=np.uint32),
+        np.frombuffer(packed["offsets"], dtype=np.uint16),
+    )
+
+def vote_offsets(q_hash, q_t, p_hash, p_report, p_t):
+    """
+    Scores every candidate report by its largest group of hashes that agree on one time
+    offset. `p_report` are small ints; returns (report ids, aligned counts), best first.
+    """
+    order = np.argsort(q_hash, kind="stable")
+    q_hash, q_t = q_hash[order], q_t[order].astype(np.int64)
+    lo = np.searchsorted(q_hash, p_hash, side="left")
+    counts = np.searchsorted(q_hash, p_hash, side="right") - lo
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    # Expand each posting against every query occurrence of its hash
+    q_idx = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lo, counts)
+    delta = np.repeat(p_t.astype(np.int64), counts) - q_t[q_idx]
+    bucket = np.floor_divide(delta, OFFSET_TOLERANCE_STEPS) + (1 << 20)
+    keys = np.repeat(p_report.astype(np.int64), counts) << 22 | bucket
+
+    uniq, votes = np.unique(keys, return_counts=True)
+    reports = uniq >> 22
+    # Best offset bucket per report
+    best = np.zeros(reports.max() + 1, dtype=np.int64)
+    np.maximum.at(best, reports, votes)
+    ids = np.flatnonzero(best)
+    ranked = np.argsort(-best[ids], kind="stable")
+    return ids[ranked], best[ids][ranked]
+
+# ------------------------------
+# INVERTED INDEX (MONGO)
+# ------------------------------
+_indexes_ready = False
+
+def ensure_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    fingerprints_collection.create_index([("h", ASCENDING), ("r", ASCENDING), ("t", ASCENDING)])
+    fingerprints_collection.create_index([("r", ASCENDING)])
+    _indexes_ready = True
+
+def _postings(report_id, packed):
+    hashes, offsets = unpack_fingerprint(packed)
+    # One posting per distinct (hash, offset); repeats add nothing to the vote
+    pairs = np.unique(hashes.astype(np.uint64) << 16 | offsets, return_index=True)[1]
+    return [
+        {"h": h, "r": report_id, "t": t}
+        for h, t in zip(hashes[pairs].tolist(), offsets[pairs].tolist())
+    ]
+
+def index_fingerprint(report_id, packed):
+    """Adds one stored report's hashes to the inverted index"""
+    postings = _postings(report_id, packed)
+    if postings:
+        ensure_indexes()
+        fingerprints_collection.insert_many(postings, ordered=False)
+
+def remove_fingerprint(report_id):
+    fingerprints_collection.delete_many({"r": report_id})
+
+def find_previous(hashes, offsets):
+    """
+    Looks a fingerprint up in the index. Returns the best earlier report as
+    {report_id, verdict, ..., matched_hashes, match_ratio} or None.
+    """
+    if hashes.size < MATCH_MIN_HASHES:
+        return None
+    ensure_indexes()
+    cursor = fingerprints_collection.find(
+        {"h": {"$in": np.unique(hashes).tolist()}},
+        {"_id": 0, "h": 1, "r": 1, "t": 1},
+    ).limit(MAX_CANDIDATE_POSTINGS)
+
+    # ObjectIds are mapped to small ints for the vote
+    index_of = {}
+    p_hash, p_report, p_t = [], [], []
+    for doc in cursor:
+        p_hash.append(doc["h"])
+        p_t.append(doc["t"])
+        p_report.append(index_of.setdefault(doc["r"], len(index_of)))
+    if not p_hash:
+        return None
+    report_ids = list(index_of)
+
+    ids, votes = vote_offsets(hashes, offsets, np.array(p_hash, dtype=np.uint32),
+                              np.array(p_report), np.array(p_t))
+    for i, aligned in zip(ids[:MATCH_CANDIDATES], votes[:MATCH_CANDIDATES]):
+        ratio = aligned / hashes.size
+        if aligned < MATCH_MIN_HASHES or ratio < MATCH_MIN_RATIO:
+            break
+        report = reports_collection.find_one(
+            {"_id": report_ids[i]},
+            {"verdict": 1, "confidence_score": 1, "timestamp": 1, "user_email": 1},
+        )
+        # Postings can briefly outlive a deleted report
+        if report:
+            return {
+                "report_id": str(report["_id"]),
+                "verdict": report.get("verdict"),
+                "confidence_score": report.get("confidence_score"),
+                "first_seen": report.get("timestamp"),
+                "user_email": report.get("user_email"),
+                "matched_hashes": int(aligned),
+                "match_ratio": round(float(ratio), 3),
+            }
+    return None
+
+def reusable_report(report_id):
+    """The stored outcome of an earlier report, for short-circuiting a known clip"""
+    return reports_collection.find_one(
+        {"_id": ObjectId(report_id)},
+        {"verdict": 1, "confidence_score": 1, "human_alignment_score": 1, "reasons": 1,
+         "features": 1, "metadata": 1, "raw_features": 1},
+    )
+
+def rebuild_index(collection=reports_collection, batch_size=INDEX_BATCH_SIZE):
+    """Drops the inverted index and rebuilds it from the fingerprints stored on reports"""
+    fingerprints_collection.drop()
+    global _indexes_ready
+    _indexes_ready = False
+
+    stats = {"reports": 0, "postings": 0}
+    ops = []
+    for doc in collection.find({"fingerprint.v": FINGERPRINT_VERSION}, {"fingerprint": 1}, batch_size=1000):
+        ops += _postings(doc["_id"], doc["fingerprint"])
+        stats["reports"] += 1
+        if len(ops) >= batch_size:
+            fingerprints_collection.insert_many(ops, ordered=False)
+            stats["postings"] += len(ops)
+            ops = []
+    if ops:
+        fingerprints_collection.insert_many(ops, ordered=False)
+        stats["postings"] += len(ops)
+
+    # Built after the bulk load: one index build is far cheaper than a billion inserts into it
+    ensure_indexes()
+    logger.info(f"Fingerprint index rebuilt: {stats['postings']} postings from {stats['reports']} reports.")
+    return stats
+
+if __name__ == "__main__":
+    # Usage: python -m app.services.fingerprint
+    print(rebuild_index())
@@ -1,23 +1,27 @@
 import librosa
 import numpy as np
 import os
-import scipy.stats
+import time
+import asyncio
 import logging
-import uuid
-import torch
-import whisper
-from fastapi.concurrency import run_in_threadpool
+import tracemalloc
+from app.services.scheduler import analysis_scheduler
+from app.services.scoring import score_features, build_reasons, verdict_label, verdict_is_invariant
+from app.services.feature_store import pack_features
+from app.services.baselines import select_profile, get_baseline
+from app.services.audio_io import AudioSource, AudioDecodeError, receive_upload
+from app.services.budget import AnalysisBudget, AnalysisCancelled, watch_disconnect, record_cost
+from app.services.previews import waveform_envelope, spectrogram_image, pack_preview
+from app.services.fingerprint import (
+    landmark_hashes, pack_fingerprint, find_previous, reusable_report, REUSE_MIN_RATIO, ANY_OWNER,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# --- OPTIMIZATION FOR HUGGING FACE (Fixes Error 137) ---
-# Limits CPU threads so the cloud server doesn't crash
-torch.set_num_threads(1) 
-
-device = "cuda" if torch.cuda.is_available() else "cpu"
-
 # We start with None. We will load it ONLY when needed (Lazy Loading)
+# torch and whisper are imported here too: they dominate import time and RSS, and the
+# cascade often finishes without ever needing them.
 whisper_model = None 
 
 def get_whisper_model():
@@ -25,6 +29,14 @@ def get_whisper_model():
     if whisper_model is None:
         try:
             logger.info("Initializing Whisper model for the first time...")
+            import torch
+            import whisper
+
+            # --- OPTIMIZATION FOR HUGGING FACE (Fixes Error 137) ---
+            # Limits CPU threads so the cloud server doesn't crash
+            torch.set_num_threads(1)
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+
             whisper_model = whisper.load_model("tiny").to(device)
             logger.info("Whisper model loaded successfully.")
         except Exception as e:
@@ -32,215 +44,425 @@ def get_whisper_model():
     return whisper_model
 
 # ------------------------------
-# BASELINE
+# ANALYSIS MODES
 # ------------------------------
-
-HUMAN_BASELINE = {
-    "pitch_jitter": (0.012, 0.007),
-    "silence_ratio": (0.14, 0.11),
-    "mfcc_consistency": (850, 320),
-    "cepstral_peak": (15.5, 4.5),
-    "spectral_entropy": (4.5, 1.6),
+# 8 kHz call audio has nothing above 4 kHz, so upsampling it to 22050 Hz only adds empty
+# bins (and CPU). Narrowband input is analysed at its native rate with a smaller FFT,
+# an entropy band limited to the telephone passband and a coarser pitch hop.
+NARROWBAND_MAX_SR = 11025
+MAX_ANALYSIS_SECONDS = 45
+WHISPER_SR = 16000
+
+# Set FORENSICS_DEBUG_MEMORY=1 to report per-request peak allocations in the metadata.
+# Target: a 45 s clip should stay under MEMORY_TARGET_MB (Whisper weights excluded).
+DEBUG_MEMORY = os.getenv("FORENSICS_DEBUG_MEMORY") == "1"
+MEMORY_TARGET_MB = 150
+
+ANALYSIS_MODES = {
+    "wideband": {
+        "sr": 22050, "n_fft": 2048, "hop_length": 512, "n_mels": 128,
+        "pitch_frame": 2048, "pitch_hop": 512, "fmax": 500, "entropy_band": None,
+    },
+    "narrowband": {
+        "sr": 8000, "n_fft": 512, "hop_length": 128, "n_mels": 40,
+        "pitch_frame": 1024, "pitch_hop": 256, "fmax": 400, "entropy_band": (300, 3400),
+    },
 }
 
-def calculate_anomaly_score(value, mean, std):
-    z = abs(value - mean) / (std + 1e-6)
-    return min(max((scipy.stats.norm.cdf(z) - 0.5) * 200, 0), 99)
-
-def calculate_human_alignment(value, mean, std):
-    z = abs(value - mean) / (std + 1e-6)
-    return min(max(100 - z * 22, 0), 100)
-
-def calculate_cepstral_peak(y, sr):
-    try:
-        S = np.abs(librosa.stft(y))
-        cepstrum = np.fft.ifft(np.log(S + 1e-6), axis=0).real
-        quef = np.fft.fftfreq(cepstrum.shape[0], d=1/sr)
-        mask = (quef > 0.002) & (quef < 0.015)
-        if not np.any(mask): return 0
-        return np.max(np.abs(cepstrum[mask])) * 1000
-    except: return 0
+# Early-exit cascade: "off" runs every stage, "whisper" skips Whisper when it can't
+# flip the verdict, "full" additionally skips pyin when the cheap features decide it
+CASCADE_MODE = os.getenv("CASCADE_MODE", "whisper")
+
+# pyin runs in chunks so cancellation and the pitch budget are checked between them;
+# clips up to one chunk long are tracked exactly as before
+PITCH_CHUNK_SECONDS = 15
+PITCH_FMIN = 60
+# yin has no voicing decision of its own: frames quieter than this (relative to the
+# loudest frame) are treated as unvoiced
+YIN_VOICED_RMS = 0.05
+
+def select_analysis_mode(native_sr):
+    if native_sr and native_sr <= NARROWBAND_MAX_SR:
+        return "narrowband"
+    return "wideband"
+
+def calculate_cepstral_peak(S, sr):
+    """Peak cepstral magnitude inside the 2-15 ms quefrency band (currently always 0)"""
+    # The band mask has always been built on np.fft.fftfreq(n_bins, d=1/sr), which is in
+    # Hz rather than seconds, so (quef > 0.002) & (quef < 0.015) never selects a bin and
+    # the feature is a constant 0. Stored reports and baselines were built on that value;
+    # fixing the quefrency axis belongs in its own change.
+    return 0
+
+def calculate_spectral_entropy(S, sr, n_fft, band=None):
+    # Row-wise sum of squares without materialising S**2
+    psd = np.einsum("ij,ij->i", S, S) / S.shape[1]
+    if band:
+        freqs = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+        psd = psd[(freqs >= band[0]) & (freqs <= band[1])]
+    psd_norm = psd / (np.sum(psd) + 1e-6)
+    return -np.sum(psd_norm * np.log2(psd_norm + 1e-12))
 
 # ------------------------------
 # SYNC WORKER (The Heavy Logic)
 # ------------------------------
-def _analyze_sync(safe_filename):
-    y, sr = librosa.load(safe_filename, sr=22050, duration=45)
-    y = librosa.util.normalize(y)
-
-    # --- FEATURE EXTRACTION ---
-    f0, _, _ = librosa.pyin(y, fmin=60, fmax=500)
+def _track_pitch(y, sr, mode, tracker):
+    """f0 per frame with NaN for unvoiced frames, from pyin or the much cheaper yin"""
+    if tracker == "pyin":
+        f0, _, _ = librosa.pyin(
+            y, fmin=PITCH_FMIN, fmax=mode["fmax"], sr=sr,
+            frame_length=mode["pitch_frame"], hop_length=mode["pitch_hop"],
+        )
+        return f0
+
+    f0 = librosa.yin(
+        y, fmin=PITCH_FMIN, fmax=mode["fmax"], sr=sr,
+        frame_length=mode["pitch_frame"], hop_length=mode["pitch_hop"],
+    )
+    rms = librosa.feature.rms(y=y, frame_length=mode["pitch_frame"], hop_length=mode["pitch_hop"])[0]
+    # Quiet frames and estimates pinned to the search limits are not voiced speech
+    unvoiced = (rms <= YIN_VOICED_RMS * rms.max()) | (f0 <= PITCH_FMIN * 1.01) | (f0 >= mode["fmax"] * 0.99)
+    f0[unvoiced] = np.nan
+    return f0
+
+def _pitch_jitter(y, sr, mode, budget, tracker="pyin"):
+    """Returns (jitter, raw f0 track with NaN for unvoiced frames)"""
+    hop = mode["pitch_hop"]
+    chunk = max(1, int(PITCH_CHUNK_SECONDS * sr) // hop) * hop
+    edges = list(range(0, len(y), chunk))
+    # A short tail is folded into the previous chunk rather than tracked on its own
+    if len(edges) > 1 and len(y) - edges[-1] < chunk // 2:
+        edges.pop()
+    edges.append(len(y))
+
+    limit = budget.allowance("pitch")
+    initial_tracker = tracker
+    started = time.monotonic()
+    tracks = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        budget.check("pitch")
+        elapsed = time.monotonic() - started
+        # Falling behind pace for the stage budget: finish the clip with yin
+        if tracker == "pyin" and start and elapsed * len(y) / start > limit:
+            tracker = "yin"
+            budget.degrade("pitch", "yin", "budget")
+        tracks.append(_track_pitch(y[start:end], sr, mode, tracker))
+
+    # Only single-tracker runs say anything about that tracker's cost
+    if tracker == initial_tracker:
+        record_cost("pitch" if tracker == "pyin" else "pitch_fast", time.monotonic() - started, len(y) / sr)
+    budget.check("pitch", deadline=False)
+
+    f0 = np.concatenate(tracks)
     pitch_jitter = 0.0
-    if f0 is not None:
-        f0 = f0[~np.isnan(f0)]
-        if len(f0) > 10:
-            pitch_jitter = np.mean(np.abs(np.diff(f0))) / np.mean(f0)
-
-    cpp_val = calculate_cepstral_peak(y, sr)
+    voiced = f0[~np.isnan(f0)]
+    if len(voiced) > 10:
+        pitch_jitter = np.mean(np.abs(np.diff(voiced))) / np.mean(voiced)
+    return pitch_jitter, f0
+
+def _whisper_logprobs(audio_16k):
+    # Whisper Analysis (Now uses Lazy Loading) - fed the decoded clip, never a file path.
+    # None means Whisper didn't run (load or transcribe failed); [] means no segments.
+    try:
+        model = get_whisper_model()
+        if model:
+            w_res = model.transcribe(audio_16k, fp16=False)
+            return [seg["avg_logprob"] for seg in w_res.get("segments", [])]
+    except Exception as e:
+        logger.error(f"Whisper Error: {e}")
+    return None
 
-    S = np.abs(librosa.stft(y))
-    psd = np.mean(S**2, axis=1)
-    psd_norm = psd / (np.sum(psd) + 1e-6)
-    spectral_entropy = -np.sum(psd_norm * np.log2(psd_norm + 1e-12))
+def _check_replay(S, sr, hop):
+    """Fingerprint the clip and look it up; a failed lookup never fails the analysis"""
+    hashes, offsets = landmark_hashes(S, sr, hop)
+    try:
+        previously_seen = find_previous(hashes, offsets)
+    except Exception as e:
+        logger.error(f"Fingerprint lookup failed: {e}")
+        previously_seen = None
+    return pack_fingerprint(hashes, offsets), previously_seen
+
+def _reused_result(previously_seen, fingerprint, metadata):
+    """Result for a known clip, copied from the earlier report instead of re-analysed"""
+    prior = reusable_report(previously_seen["report_id"])
+    if not prior:
+        return None
+    return {
+        "verdict": prior["verdict"],
+        "confidence_score": prior.get("confidence_score", 0.0),
+        "human_alignment_score": prior.get("human_alignment_score", 0.0),
+        "reasons": list(prior.get("reasons", [])),
+        "features": prior.get("features", {}),
+        "metadata": {
+            **prior.get("metadata", {}),
+            **metadata,
+            "stages": ["fingerprint"],
+            "skipped_stages": ["acoustic", "pitch", "whisper"],
+            "previously_seen": previously_seen,
+            "reused_verdict": True,
+        },
+        # The earlier vector, so a later rescore treats both reports the same way
+        "raw_features": prior.get("raw_features"),
+        "fingerprint": fingerprint,
+        "preview": None,
+    }
 
-    mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
+def _analyze_sync(
+    audio, profile=None, cascade=None, preview=False, replay_check=None, budget=None, reuse_owner=None,
+):
+    """
+    replay_check: None skips fingerprinting, "flag" reports a matching earlier report,
+    "reuse" also returns that report's verdict when the match is strong enough and the
+    report belongs to reuse_owner (an email, or ANY_OWNER for admins).
+    budget: an AnalysisBudget shared with the caller (a fresh one if omitted).
+    """
+    if isinstance(audio, str):
+        audio = AudioSource.from_path(audio)
+    budget = budget or AnalysisBudget()
+    if not DEBUG_MEMORY:
+        return _run_analysis(audio, profile, cascade or CASCADE_MODE, preview, replay_check, budget, reuse_owner)
+
+    # tracemalloc sees every numpy buffer; it is process-wide, so concurrent requests
+    # inflate each other's numbers. Debug use only.
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    result = _run_analysis(audio, profile, cascade or CASCADE_MODE, preview, replay_check, budget, reuse_owner)
+    peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    result["metadata"]["peak_memory_mb"] = round(peak_mb, 1)
+    result["metadata"]["memory_target_mb"] = MEMORY_TARGET_MB
+    return result
+
+def _run_analysis(audio, profile, cascade, preview, replay_check, budget, reuse_owner=None):
+    # float32 end to end: decode, resample, STFT (complex64) and every spectrogram after it
+    with budget.stage("decode"):
+        y, native_sr = audio.decode(duration=MAX_ANALYSIS_SECONDS, timeout=budget.allowance("decode"))
+    analysis_mode = select_analysis_mode(native_sr)
+    mode = ANALYSIS_MODES[analysis_mode]
+    n_fft, hop = mode["n_fft"], mode["hop_length"]
+
+    sr = mode["sr"]
+    if native_sr != sr:
+        y = librosa.resample(y, orig_sr=native_sr, target_sr=sr)
+    y = librosa.util.normalize(y.astype(np.float32, copy=False))
+    acoustic_started = time.monotonic()
+
+    # --- CHEAP FEATURES FIRST ---
+    # One STFT feeds entropy, cepstrum and MFCC; it is squared in place for the mel
+    # filterbank and dropped as soon as the MFCCs exist.
+    S = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop))
+
+    # --- REPLAY CHECK (before any other feature is computed) ---
+    fingerprint, previously_seen = None, None
+    if replay_check:
+        fingerprint, previously_seen = _check_replay(S, sr, hop)
+        if (
+            replay_check == "reuse" and previously_seen
+            and previously_seen["match_ratio"] >= REUSE_MIN_RATIO
+            # Another user's features and reasons are never handed out
+            and reuse_owner in (ANY_OWNER, previously_seen["user_email"])
+        ):
+            reused = _reused_result(previously_seen, fingerprint, {
+                "sample_rate": int(sr),
+                "native_sample_rate": int(native_sr) if native_sr else None,
+                "duration": round(float(len(y) / sr), 2),
+                "analysis_mode": analysis_mode,
+            })
+            if reused:
+                return reused
+
+    spectral_entropy = calculate_spectral_entropy(S, sr, n_fft, mode["entropy_band"])
+    cpp_val = calculate_cepstral_peak(S, sr)
+
+    np.square(S, out=S)
+    mel = librosa.feature.melspectrogram(S=S, sr=sr, n_mels=mode["n_mels"])
+    del S
+    log_mel = librosa.power_to_db(mel)
+    del mel
+    mfcc = librosa.feature.mfcc(S=log_mel, n_mfcc=13)
+    # The preview only needs the downsampled image, so keep that instead of log_mel
+    spectrogram_preview = spectrogram_image(log_mel) if preview else None
+    del log_mel
     mfcc_var = np.mean(np.var(mfcc, axis=1))
     mfcc_time_var = np.mean(np.var(mfcc, axis=0))
 
     # Energy modulation
-    rms = librosa.feature.rms(y=y)
+    rms = librosa.feature.rms(y=y, frame_length=n_fft, hop_length=hop)
     energy_var = np.std(rms)
 
-    non_silent = librosa.effects.split(y, top_db=30)
+    non_silent = librosa.effects.split(y, top_db=30, frame_length=n_fft, hop_length=hop)
     non_silent_dur = sum(e - s for s, e in non_silent) / sr
     total_dur = librosa.get_duration(y=y, sr=sr)
     silence_ratio = (total_dur - non_silent_dur) / total_dur if total_dur > 0 else 0
+    record_cost("acoustic", time.monotonic() - acoustic_started, total_dur)
+    budget.check("acoustic")
+
+    # Narrowband features are only comparable with the telephony baseline, and that
+    # baseline only with narrowband features: a telephony request on wideband input falls
+    # back to automatic selection (metadata keeps requested_profile to show it)
+    requested_profile = profile
+    if analysis_mode == "narrowband":
+        profile = "telephony"
+    elif profile == "telephony":
+        profile = None
+    profile = select_profile(
+        sample_rate=native_sr,
+        codec=audio.ext,
+        # The whole recording, not the MAX_ANALYSIS_SECONDS that were decoded
+        duration=audio.full_duration or total_dur,
+        requested=profile,
+    )
+    baseline = get_baseline(profile)
+
+    raw = {
+        "pitch_jitter": np.nan,
+        "cepstral_peak": cpp_val,
+        "spectral_entropy": spectral_entropy,
+        "silence_ratio": silence_ratio,
+        "mfcc_consistency": mfcc_var,
+        "mfcc_time_var": mfcc_time_var,
+        "energy_var": energy_var,
+        "whisper_logprob_std": np.nan,
+        "duration": total_dur,
+    }
+    stages = ["acoustic"]
+    skipped = []
+    f0 = None
+    envelope = waveform_envelope(y) if preview else None
+
+    # --- EXPENSIVE STAGES (skipped when they provably can't flip the verdict) ---
+    # Under load or when the budget can't cover them they are degraded instead: Whisper
+    # is dropped first, then pyin gives way to yin. Pitch itself is never dropped.
+    if cascade == "full" and verdict_is_invariant(raw, baseline, ["pitch_jitter", "whisper_logprob_std"]):
+        skipped += ["pitch", "whisper"]
+    else:
+        tracker = "pyin"
+        if analysis_scheduler.load_level() >= 2:
+            tracker = "yin"
+            budget.degrade("pitch", "yin", "load")
+        elif not budget.can_afford("pitch", total_dur):
+            tracker = "yin"
+            budget.degrade("pitch", "yin", "budget")
+
+        if tracker == "yin" and not budget.can_afford("pitch", total_dur, cost_key="pitch_fast"):
+            # Scoring would impute a missing jitter with the baseline mean, i.e. as
+            # perfectly human; that is only safe for the cascade, so give up instead
+            raise AnalysisCancelled("deadline", "pitch")
+        raw["pitch_jitter"], f0 = _pitch_jitter(y, sr, mode, budget, tracker)
+        stages.append("pitch")
+
+    log_probs = []
+    if "whisper" not in skipped:
+        if cascade in ("whisper", "full") and verdict_is_invariant(raw, baseline, ["whisper_logprob_std"]):
+            skipped.append("whisper")
+        elif analysis_scheduler.load_level() >= 1:
+            budget.degrade("whisper", "skipped", "load")
+        elif not budget.can_afford("whisper", total_dur):
+            budget.degrade("whisper", "skipped", "budget")
+        else:
+            # Only the 16 kHz copy outlives this point
+            audio_16k = librosa.resample(y, orig_sr=sr, target_sr=WHISPER_SR)
+            del y
+            # A cold model load isn't part of the per-clip cost estimate
+            if get_whisper_model() is None:
+                budget.degrade("whisper", "skipped", "error")
+            else:
+                budget.check("whisper")
+                started = time.monotonic()
+                log_probs = _whisper_logprobs(audio_16k)
+                if log_probs is None:
+                    # Only a stage that actually ran counts, in stages and in the cost estimate
+                    budget.degrade("whisper", "skipped", "error")
+                    log_probs = []
+                else:
+                    record_cost("whisper", time.monotonic() - started, total_dur)
+                    stages.append("whisper")
+                budget.check("whisper", deadline=False)
+            del audio_16k
+    raw["whisper_logprob_std"] = np.std(log_probs) if len(log_probs) >= 2 else np.nan
+    pitch_jitter = raw["pitch_jitter"]
 
     # --- SCORING ---
-    scores = {}
-    human_alignment = {}
-
-    for name, value in [
-        ("pitch_jitter", pitch_jitter),
-        ("cepstral_peak", cpp_val),
-        ("spectral_entropy", spectral_entropy),
-        ("silence_ratio", silence_ratio),
-        ("mfcc_consistency", mfcc_var)
-    ]:
-        mean, std = HUMAN_BASELINE.get(name, (0, 1))
-        scores[name] = calculate_anomaly_score(value, mean, std)
-        human_alignment[name] = calculate_human_alignment(value, mean, std)
-
-    final_fake_prob = (
-        scores["pitch_jitter"] * 0.16 +
-        scores["cepstral_peak"] * 0.22 +
-        scores["spectral_entropy"] * 0.15 +
-        scores["silence_ratio"] * 0.15 +
-        scores["mfcc_consistency"] * 0.17
+    scored = score_features(
+        {k: np.atleast_1d(np.float64(v)) for k, v in raw.items()},
+        baseline=baseline,
     )
+    verdict = verdict_label(scored["is_human"][0])
+    normalized_fake = scored["normalized_fake"][0]
+    normalized_human = scored["normalized_human"][0]
 
-    # --- STABILITY IMPROVEMENTS ---
-    stability_score = 0
-    if mfcc_time_var > 150: stability_score -= 8
-    if energy_var > 0.02: stability_score -= 6
-    if pitch_jitter < 0.002: stability_score += 6
-
-    # Whisper Analysis (Now uses Lazy Loading)
-    whisper_boost = 0
-    try:
-        model = get_whisper_model()
-        if model:
-            w_res = model.transcribe(safe_filename, fp16=False)
-            if "segments" in w_res and len(w_res["segments"]) >= 2:
-                log_probs = [seg["avg_logprob"] for seg in w_res["segments"]]
-                prob_var = np.std(log_probs)
-                if prob_var < 0.08: whisper_boost = 12
-                elif prob_var < 0.15: whisper_boost = 6
-                else: whisper_boost = -5
-    except Exception as e:
-        logger.error(f"Whisper Error: {e}")
-
-    final_fake_prob += stability_score + whisper_boost
-
-    # --- CONFIDENCE CALIBRATION ---
-    human_confidence = np.mean(list(human_alignment.values()))
-    confidence_gap = abs(final_fake_prob - human_confidence)
-
-    if confidence_gap < 10: final_fake_prob *= 0.95
-    if human_confidence > 75 and final_fake_prob < 65: final_fake_prob -= 12
-    if final_fake_prob > 75 and human_confidence < 45: final_fake_prob += 5
-
-    final_fake_prob = min(max(final_fake_prob, 2), 98)
-
-    # Verdict
-    if final_fake_prob > 72 and human_confidence < 48:
-        verdict = "AI/Synthetic"
-    elif final_fake_prob < 42 and human_confidence > 55:
-        verdict = "Real Human"
-    else:
-        verdict = "Real Human" if human_confidence > final_fake_prob or confidence_gap < 8 else "AI/Synthetic"
-
-    # Normalize
-    total_score = final_fake_prob + human_confidence
-    if total_score > 0:
-        normalized_fake = (final_fake_prob / total_score) * 100
-        normalized_human = (human_confidence / total_score) * 100
-    else:
-        normalized_fake = 50; normalized_human = 50
-
-    if verdict == "Real Human" and normalized_fake >= 50:
-        normalized_fake = 49.9; normalized_human = 50.1
-    elif verdict == "AI/Synthetic" and normalized_human >= 50:
-        normalized_human = 49.9; normalized_fake = 50.1
-
-    # --- DYNAMIC REASONS GENERATION ---
-    reasons = []
-
-    # 1. AI Flags
-    if whisper_boost > 5:
-        reasons.append("Phoneme duration is mathematically too perfect (AI Artifact).")
-    if pitch_jitter < 0.003:
-        reasons.append("Pitch is unnaturally stable (Robotic/Vocoded synthesis).")
-    if mfcc_time_var < 50:
-        reasons.append("Spectral texture lacks natural human variability.")
-    if energy_var < 0.005:
-        reasons.append("Amplitude modulation is too flat (TTS characteristic).")
-
-    # 2. Human Flags (if valid)
-    if verdict == "Real Human":
-        if mfcc_time_var > 120:
-            reasons.append("High temporal variance confirms biological speech patterns.")
-        if energy_var > 0.015:
-            reasons.append("Natural breath/volume modulation detected.")
-        if not reasons: 
-            reasons.append("Bio-metric variability falls within normal human parameters.")
-            reasons.append("Harmonic integrity matches organic vocal cords.")
-
-    # 3. Fallback for AI
-    if verdict == "AI/Synthetic" and not reasons:
-        reasons.append("Overall statistical profile matches synthetic training data.")
-        reasons.append("Lack of organic micro-tremors in high frequencies.")
+    reasons = build_reasons(verdict, scored["whisper_boost"][0], pitch_jitter, mfcc_time_var, energy_var)
 
     return {
         "verdict": verdict,
-        "confidence_score": float(round(normalized_fake, 2)),
-        "human_alignment_score": float(round(normalized_human, 2)),
-        "reasons": reasons[:3], 
+        "confidence_score": round(float(normalized_fake), 2),
+        "human_alignment_score": round(float(normalized_human), 2),
+        "reasons": reasons,
         "features": {
-            "jitter": float(round(pitch_jitter, 5)),
-            "cepstral_peak": float(round(cpp_val, 2)),
-            "spectral_entropy": float(round(spectral_entropy, 3)),
-            "silence_ratio": float(round(silence_ratio, 3)),
-            "mfcc_temporal_variance": float(round(mfcc_time_var, 2)),
-            "energy_variation": float(round(energy_var, 4))
+            "jitter": None if np.isnan(pitch_jitter) else round(float(pitch_jitter), 5),
+            "cepstral_peak": round(float(cpp_val), 2),
+            "spectral_entropy": round(float(spectral_entropy), 3),
+            "silence_ratio": round(float(silence_ratio), 3),
+            "mfcc_temporal_variance": round(float(mfcc_time_var), 2),
+            "energy_variation": round(float(energy_var), 4)
+        },
+        "metadata": {
+            "sample_rate": int(sr),
+            "native_sample_rate": int(native_sr) if native_sr else None,
+            "duration": round(float(total_dur), 2),
+            "channel_profile": profile,
+            "requested_profile": requested_profile,
+            "analysis_mode": analysis_mode,
+            "stages": stages,
+            "skipped_stages": skipped,
+            "degraded_stages": dict(budget.degraded),
+            **({"previously_seen": previously_seen} if replay_check else {}),
         },
-        "metadata": {"sample_rate": int(sr), "duration": float(round(total_dur, 2))}
+        # Full-precision features for re-scoring; stripped from API responses
+        "raw_features": pack_features(raw, log_probs, mfcc),
+        # Landmark hashes (or None); stored on the report and indexed, also stripped
+        "fingerprint": fingerprint,
+        # Packed preview blob (or None); stored per report and also stripped
+        "preview": pack_preview(
+            total_dur, envelope, spectrogram_preview, non_silent / sr, f0, mode["pitch_hop"] / sr,
+        ) if preview else None,
     }
 
 # ------------------------------
 # ASYNC WRAPPER
 # ------------------------------
-async def analyze_audio_forensics(file_upload, filename: str):
-    ext = os.path.splitext(filename)[1] or ".tmp"
-    safe_filename = f"temp_{uuid.uuid4().hex}{ext}"
-    
+async def analyze_audio_forensics(
+    file_upload, filename: str, profile: str = None,
+    user_key: str = "anonymous", role: str = "user", ticket: dict = None, preview: bool = False,
+    replay_check: str = None, is_disconnected=None, reuse_owner: str = None,
+):
+    """
+    Runs one analysis under a fresh AnalysisBudget. `is_disconnected` (the request's
+    coroutine) is polled so a client that goes away cancels the job at its next checkpoint.
+    Raises AnalysisCancelled, AudioDecodeError or the original error; see budget.analysis_http_error.
+    """
+    # The deadline starts here, so time spent waiting for a worker is spent budget
+    budget = AnalysisBudget()
+    watcher = asyncio.create_task(watch_disconnect(is_disconnected, budget)) if is_disconnected else None
+    source = None
     try:
-        content = await file_upload.read()
-        with open(safe_filename, "wb") as f:
-            f.write(content)
-
-        return await run_in_threadpool(_analyze_sync, safe_filename)
-
-    except Exception as e:
-        logger.error(f"Forensics Error: {e}")
-        return {
-            "verdict": "Error",
-            "confidence_score": 0.0,
-            "reasons": ["Analysis Failed"],
-            "features": {},
-            "metadata": {}
-        }
+        source = await receive_upload(file_upload, filename)
+        return await analysis_scheduler.run(
+            user_key, role, _analyze_sync, source, profile, None, preview, replay_check, budget,
+            reuse_owner, ticket=ticket,
+        )
+
+    except AnalysisCancelled as e:
+        logger.warning(f"Forensics cancelled for '{filename}': {e}")
+        raise
+    except AudioDecodeError as e:
+        logger.warning(f"Undecodable upload '{filename}': {e}")
+        raise
+    except Exception:
+        logger.exception(f"Forensics Error for '{filename}'")
+        raise
     finally:
-        if os.path.exists(safe_filename):
-            try: os.remove(safe_filename)
-            except: pass
\ No newline at end of file
+        if watcher:
+            watcher.cancel()
+        if source:
+            source.close()
@@ -101,7 +101,7 @@ def generate_pdf_report(analysis_data):
     features = analysis_data.get("features", {})
     data = [
         ["Metric", "Value", "Status"],
-        ["Pitch Jitter", f"{features.get('jitter', 0):.5f}", "Analyzed"],
+        ["Pitch Jitter", f"{features['jitter']:.5f}", "Analyzed"] if features.get('jitter') is not None else ["Pitch Jitter", "-", "Skipped"],
         ["Cepstral Peak", f"{features.get('cepstral_peak', 0):.2f}", "Analyzed"],
         ["Entropy", f"{features.get('spectral_entropy', 0):.3f}", "Analyzed"],
         ["Silence", f"{features.get('silence_ratio', 0):.3f}", "Analyzed"]
@@ -0,0 +1,161 @@
+import os
+import time
+import math
+import logging
+import threading
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from pymongo import ReturnDocument
+
+from app.auth import get_current_user
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# LIMITS
+# ------------------------------
+# "<burst>:<tokens per minute>" per role. Guest tokens need no credentials, so guests
+# get a small bucket per client IP; admins are not limited.
+def _parse_limit(value):
+    burst, per_minute = value.split(":")
+    return float(burst), float(per_minute) / 60.0
+
+RATE_LIMITS = {
+    "guest": _parse_limit(os.getenv("RATE_LIMIT_GUEST", "3:2")),
+    "user": _parse_limit(os.getenv("RATE_LIMIT_USER", "10:20")),
+}
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+
+# Behind a proxy (Hugging Face, Heroku) the socket peer is the proxy, so every guest
+# would share its bucket. Each proxy appends the address it saw to X-Forwarded-For, so
+# with N proxies in front of the app the client is the N-th entry from the right;
+# anything further left was written by the client and is ignored. Never run uvicorn with
+# FORWARDED_ALLOW_IPS="*": it takes the left-most entry, which the client controls.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+BUCKET_SWEEP_SECONDS = 60
+
+# ------------------------------
+# BACKENDS
+# ------------------------------
+class InMemoryBucketStore:
+    """Token buckets for a single process"""
+
+    def __init__(self):
+        # key -> (tokens, updated, seconds until a bucket left alone is full again)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._swept = time.time()
+
+    def _sweep(self, now):
+        # A full bucket is the same as no bucket, so idle callers are forgotten
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items()
+            if now - bucket[1] < bucket[2]
+        }
+        self._swept = now
+
+    def take(self, key, capacity, rate, now=None):
+        """Refills the bucket, tries to take one token; returns (allowed, tokens_left)"""
+        now = now if now is not None else time.time()
+        with self._lock:
+            if now - self._swept >= BUCKET_SWEEP_SECONDS:
+                self._sweep(now)
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, 0))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            refill_seconds = capacity / rate if rate > 0 else float("inf")
+            self._buckets[key] = (tokens, now, refill_seconds)
+        return allowed, tokens
+
+class MongoBucketStore:
+    """Token buckets shared by every worker/instance, updated atomically in Mongo"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def take(self, key, capacity, rate, now=None):
+        now = now if now is not None else time.time()
+        refilled = {"$min": [capacity, {"$add": [
+            {"$ifNull": ["$tokens", capacity]},
+            {"$multiply": [{"$subtract": [now, {"$ifNull": ["$updated", now]}]}, rate]},
+        ]}]}
+        doc = self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled}},
+                {"$set": {
+                    "allowed": {"$gte": ["$tokens", 1]},
+                    "tokens": {"$cond": [{"$gte": ["$tokens", 1]}, {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    "updated": now,
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return doc["allowed"], doc["tokens"]
+
+_store = None
+
+def get_bucket_store():
+    global _store
+    if _store is None:
+        if RATE_LIMIT_BACKEND == "mongo":
+            from app.database import rate_limits_collection
+            _store = MongoBucketStore(rate_limits_collection)
+        else:
+            _store = InMemoryBucketStore()
+    return _store
+
+# ------------------------------
+# DEPENDENCY
+# ------------------------------
+def client_ip(request):
+    peer = request.client.host if request.client else "unknown"
+    if TRUSTED_PROXY_HOPS <= 0:
+        return peer
+    hops = [
+        hop.strip()
+        for header in request.headers.getlist("x-forwarded-for")
+        for hop in header.split(",")
+        if hop.strip()
+    ]
+    if len(hops) < TRUSTED_PROXY_HOPS:
+        # Not every proxy added itself, so the request didn't come through them
+        return peer
+    return hops[-TRUSTED_PROXY_HOPS]
+
+def rate_limit_key(user, request):
+    if user["role"] == "guest":
+        return f"guest:{client_ip(request)}"
+    return f"{user['role']}:{user['email']}"
+
+async def enforce_rate_limit(
+    request: Request,
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+):
+    """Rejects the request with 429 once the caller's token bucket is empty"""
+    limit = RATE_LIMITS.get(current_user["role"])
+    if limit is None:
+        return current_user
+
+    capacity, rate = limit
+    try:
+        allowed, tokens = get_bucket_store().take(rate_limit_key(current_user, request), capacity, rate)
+    except Exception as e:
+        # Fail open: a broken shared backend must not take the API down with it
+        logger.error(f"Rate limiter unavailable: {e}")
+        return current_user
+
+    response.headers["X-RateLimit-Limit"] = str(int(capacity))
+    response.headers["X-RateLimit-Remaining"] = str(int(tokens))
+    if not allowed:
+        retry_after = math.ceil((1 - tokens) / rate) if rate > 0 else 60
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many analysis requests. Please wait and try again.",
+            headers={"Retry-After": str(retry_after)},
+        )
+    return current_user
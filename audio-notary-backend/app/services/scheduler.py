@@ -0,0 +1,147 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# FAIR-SHARE ANALYSIS SCHEDULER
+# ------------------------------
+# Analysis jobs no longer go straight into the shared threadpool first-come-first-served.
+# Each caller gets a virtual-time queue (start-time fair queuing): a job's tag is
+# max(now_virtual, caller's last tag) + 1/weight, and free workers always take the
+# smallest tag. A caller flooding the queue only pushes back its own jobs, and guests
+# can never hold more than GUEST_MAX_WORKERS of the analysis workers at once.
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "2"))
+GUEST_MAX_WORKERS = int(os.getenv("GUEST_MAX_WORKERS", "1"))
+ROLE_WEIGHTS = {"guest": 1.0, "user": 4.0, "admin": 4.0}
+
+# Queue depth at which running analyses start shedding work: Whisper goes first, then
+# pyin is swapped for the much cheaper yin tracker (see forensics._run_analysis)
+DEGRADE_WHISPER_QUEUE = int(os.getenv("DEGRADE_WHISPER_QUEUE", "4"))
+DEGRADE_PITCH_QUEUE = int(os.getenv("DEGRADE_PITCH_QUEUE", "8"))
+
+class _Job:
+    __slots__ = ("tag", "start", "seq", "is_guest", "granted", "cancelled")
+
+    def __init__(self, tag, start, seq, is_guest, granted):
+        self.tag = tag
+        self.start = start
+        self.seq = seq
+        self.is_guest = is_guest
+        self.granted = granted
+        self.cancelled = False
+
+class FairScheduler:
+    def __init__(self, workers=ANALYSIS_WORKERS, guest_workers=GUEST_MAX_WORKERS):
+        self.workers = workers
+        self.guest_workers = min(guest_workers, workers)
+        self._queue = []
+        self._last_tag = {}
+        self._vtime = 0.0
+        self._running = 0
+        self._guest_running = 0
+        # Live queued jobs by kind; cancelled jobs leave the heap as soon as they cancel
+        self._waiting = {False: 0, True: 0}
+        self._seq = itertools.count()
+
+    def queue_position(self, job):
+        """0-based number of queued jobs that will be dispatched before this one"""
+        return sum(1 for _, _, other in self._queue
+                   if not other.cancelled and (other.tag, other.seq) < (job.tag, job.seq))
+
+    def load_level(self):
+        """0 = normal, 1 = drop Whisper, 2 = also use the fast pitch tracker"""
+        # Read from worker threads, so only plain int reads. Guests beyond their free worker
+        # slots can't be dispatched and never delay anyone else, so they don't count.
+        guest_slots = max(0, self.guest_workers - self._guest_running)
+        waiting = self._waiting[False] + min(self._waiting[True], guest_slots)
+        if waiting >= DEGRADE_PITCH_QUEUE:
+            return 2
+        if waiting >= DEGRADE_WHISPER_QUEUE:
+            return 1
+        return 0
+
+    def _enqueue(self, user_key, role):
+        weight = ROLE_WEIGHTS.get(role, 1.0)
+        start = max(self._vtime, self._last_tag.get(user_key, 0.0))
+        tag = start + 1.0 / weight
+        self._last_tag[user_key] = tag
+
+        job = _Job(tag, start, next(self._seq), role == "guest", asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, (job.tag, job.seq, job))
+        self._waiting[job.is_guest] += 1
+        return job
+
+    def _withdraw(self, job):
+        self._queue = [entry for entry in self._queue if entry[2] is not job]
+        heapq.heapify(self._queue)
+        self._waiting[job.is_guest] -= 1
+
+    def _dispatch(self):
+        deferred = []
+        while self._queue and self._running < self.workers:
+            _, _, job = heapq.heappop(self._queue)
+            if job.cancelled:
+                continue
+            if job.is_guest and self._guest_running >= self.guest_workers:
+                deferred.append(job)
+                continue
+            self._running += 1
+            self._guest_running += job.is_guest
+            self._waiting[job.is_guest] -= 1
+            self._vtime = max(self._vtime, job.start)
+            job.granted.set_result(True)
+        for job in deferred:
+            heapq.heappush(self._queue, (job.tag, job.seq, job))
+
+        # Callers whose last tag is already behind virtual time are idle; forget them
+        if len(self._last_tag) > 10000:
+            self._last_tag = {k: t for k, t in self._last_tag.items() if t > self._vtime}
+
+    def _release(self, job):
+        self._running -= 1
+        self._guest_running -= job.is_guest
+        self._dispatch()
+
+    async def run(self, user_key, role, func, *args, ticket=None):
+        """
+        Waits for a fair-share worker slot, then runs `func(*args)` in the threadpool.
+        If `ticket` is a dict it receives queue_position and wait_ms for the caller.
+        """
+        job = self._enqueue(user_key, role)
+        queued_at = time.perf_counter()
+        if ticket is not None:
+            ticket["queue_position"] = self.queue_position(job)
+        self._dispatch()
+
+        try:
+            await job.granted
+        except asyncio.CancelledError:
+            # Client went away while queued: give the slot back if it was just granted
+            job.cancelled = True
+            if job.granted.done() and not job.granted.cancelled():
+                self._release(job)
+            else:
+                self._withdraw(job)
+            raise
+
+        if ticket is not None:
+            ticket["wait_ms"] = int((time.perf_counter() - queued_at) * 1000)
+        try:
+            return await run_in_threadpool(func, *args)
+        finally:
+            self._release(job)
+
+analysis_scheduler = FairScheduler()
+
+def apply_queue_headers(response, ticket):
+    if "queue_position" in ticket:
+        response.headers["X-Queue-Position"] = str(ticket["queue_position"])
+    if "wait_ms" in ticket:
+        response.headers["X-Queue-Wait-Ms"] = str(ticket["wait_ms"])
@@ -0,0 +1,185 @@
+import numpy as np
+from scipy.special import ndtr
+
+# ------------------------------
+# BASELINE
+# ------------------------------
+
+HUMAN_BASELINE = {
+    "pitch_jitter": (0.012, 0.007),
+    "silence_ratio": (0.14, 0.11),
+    "mfcc_consistency": (850, 320),
+    "cepstral_peak": (15.5, 4.5),
+    "spectral_entropy": (4.5, 1.6),
+}
+
+# Narrowband (8 kHz, 300-3400 Hz) telephony analysis sees fewer spectral bins and a
+# 40-band mel filterbank, which shifts entropy, cepstral and MFCC statistics
+NARROWBAND_BASELINE = {
+    "pitch_jitter": (0.014, 0.008),
+    "silence_ratio": (0.18, 0.12),
+    "mfcc_consistency": (620, 260),
+    "cepstral_peak": (13.0, 4.5),
+    "spectral_entropy": (5.2, 1.1),
+}
+
+# Features that are compared against HUMAN_BASELINE, with their weight in the fake probability
+SCORED_FEATURES = {
+    "pitch_jitter": 0.16,
+    "cepstral_peak": 0.22,
+    "spectral_entropy": 0.15,
+    "silence_ratio": 0.15,
+    "mfcc_consistency": 0.17,
+}
+
+def calculate_anomaly_score(value, mean, std):
+    z = np.abs(value - mean) / (std + 1e-6)
+    return np.clip((ndtr(z) - 0.5) * 200, 0, 99)
+
+def calculate_human_alignment(value, mean, std):
+    z = np.abs(value - mean) / (std + 1e-6)
+    return np.clip(100 - z * 22, 0, 100)
+
+def whisper_boost_from_std(prob_var):
+    """Maps the std of Whisper segment logprobs to a score boost (NaN = Whisper didn't run)"""
+    prob_var = np.asarray(prob_var, dtype=np.float64)
+    boost = np.where(prob_var < 0.08, 12, np.where(prob_var < 0.15, 6, -5))
+    return np.where(np.isnan(prob_var), 0, boost)
+
+# ------------------------------
+# VECTORIZED SCORING
+# ------------------------------
+def score_features(cols, baseline=None):
+    """
+    Turns raw feature columns into verdicts. Every value in `cols` is a numpy array
+    (one entry per report), so the same code scores a single upload or millions of
+    stored reports in one pass. `baseline` is the channel profile's (mean, std) table.
+    """
+    baseline = baseline or HUMAN_BASELINE
+    n = len(cols["pitch_jitter"])
+    final_fake_prob = np.zeros(n)
+    alignments = []
+
+    for name, weight in SCORED_FEATURES.items():
+        mean, std = baseline.get(name, (0, 1))
+        # Features from skipped stages (NaN) are scored as if they sat on the baseline mean.
+        # Only the cascade skips a scored feature, and only when no value could flip the verdict.
+        values = np.where(np.isnan(cols[name]), mean, cols[name])
+        final_fake_prob += calculate_anomaly_score(values, mean, std) * weight
+        alignments.append(calculate_human_alignment(values, mean, std))
+
+    # --- STABILITY IMPROVEMENTS ---
+    stability_score = (
+        np.where(cols["mfcc_time_var"] > 150, -8, 0) +
+        np.where(cols["energy_var"] > 0.02, -6, 0) +
+        np.where(cols["pitch_jitter"] < 0.002, 6, 0)
+    )
+    whisper_boost = whisper_boost_from_std(cols["whisper_logprob_std"])
+
+    final_fake_prob = final_fake_prob + stability_score + whisper_boost
+
+    # --- CONFIDENCE CALIBRATION ---
+    human_confidence = np.mean(alignments, axis=0)
+    confidence_gap = np.abs(final_fake_prob - human_confidence)
+
+    final_fake_prob = np.where(confidence_gap < 10, final_fake_prob * 0.95, final_fake_prob)
+    final_fake_prob = np.where((human_confidence > 75) & (final_fake_prob < 65), final_fake_prob - 12, final_fake_prob)
+    final_fake_prob = np.where((final_fake_prob > 75) & (human_confidence < 45), final_fake_prob + 5, final_fake_prob)
+
+    final_fake_prob = np.clip(final_fake_prob, 2, 98)
+
+    # Verdict
+    strict_ai = (final_fake_prob > 72) & (human_confidence < 48)
+    strict_human = (final_fake_prob < 42) & (human_confidence > 55)
+    lenient_human = (human_confidence > final_fake_prob) | (confidence_gap < 8)
+    is_human = ~strict_ai & (strict_human | lenient_human)
+
+    # Normalize
+    total_score = final_fake_prob + human_confidence
+    safe_total = np.where(total_score > 0, total_score, 1)
+    normalized_fake = np.where(total_score > 0, final_fake_prob / safe_total * 100, 50)
+    normalized_human = np.where(total_score > 0, human_confidence / safe_total * 100, 50)
+
+    flip_human = is_human & (normalized_fake >= 50)
+    flip_ai = ~is_human & (normalized_human >= 50)
+    normalized_fake = np.where(flip_human, 49.9, np.where(flip_ai, 50.1, normalized_fake))
+    normalized_human = np.where(flip_human, 50.1, np.where(flip_ai, 49.9, normalized_human))
+
+    return {
+        "is_human": is_human,
+        "final_fake_prob": final_fake_prob,
+        "human_confidence": human_confidence,
+        "whisper_boost": whisper_boost,
+        "normalized_fake": normalized_fake,
+        "normalized_human": normalized_human,
+    }
+
+# ------------------------------
+# CASCADE BOUNDS
+# ------------------------------
+# One logprob std per Whisper boost band: not run (0), <0.08 (+12), <0.15 (+6), else (-5)
+WHISPER_STD_CANDIDATES = (np.nan, 0.0, 0.1, 1.0)
+
+def _pitch_candidates(baseline):
+    mean, std = baseline.get("pitch_jitter", (0, 1))
+    # Both pitch scores saturate by z = 4.55, so this grid spans every reachable score pair
+    spread = mean + np.linspace(0, 4.6, 921) * std
+    # Jitter under 0.002 also triggers the stability bonus
+    stable = np.linspace(0, 0.002, 100, endpoint=False)
+    return np.concatenate([spread, stable])
+
+def verdict_is_invariant(raw, baseline, unknown):
+    """
+    True when no value the `unknown` features could take would change the verdict for
+    the already-known features in `raw`. Whisper is checked exhaustively (its boost is
+    discrete); pitch jitter is swept across its full score range.
+    """
+    candidates = {
+        "pitch_jitter": _pitch_candidates(baseline),
+        "whisper_logprob_std": np.array(WHISPER_STD_CANDIDATES),
+    }
+    mesh = np.meshgrid(*[candidates[name] for name in unknown], indexing="ij")
+    n = mesh[0].size
+
+    cols = {name: np.full(n, value, dtype=np.float64) for name, value in raw.items()}
+    for name, grid in zip(unknown, mesh):
+        cols[name] = grid.ravel()
+
+    is_human = score_features(cols, baseline)["is_human"]
+    return bool(is_human.all() or not is_human.any())
+
+# ------------------------------
+# DYNAMIC REASONS GENERATION
+# ------------------------------
+def build_reasons(verdict, whisper_boost, pitch_jitter, mfcc_time_var, energy_var):
+    reasons = []
+
+    # 1. AI Flags
+    if whisper_boost > 5:
+        reasons.append("Phoneme duration is mathematically too perfect (AI Artifact).")
+    if pitch_jitter < 0.003:
+        reasons.append("Pitch is unnaturally stable (Robotic/Vocoded synthesis).")
+    if mfcc_time_var < 50:
+        reasons.append("Spectral texture lacks natural human variability.")
+    if energy_var < 0.005:
+        reasons.append("Amplitude modulation is too flat (TTS characteristic).")
+
+    # 2. Human Flags (if valid)
+    if verdict == "Real Human":
+        if mfcc_time_var > 120:
+            reasons.append("High temporal variance confirms biological speech patterns.")
+        if energy_var > 0.015:
+            reasons.append("Natural breath/volume modulation detected.")
+        if not reasons:
+            reasons.append("Bio-metric variability falls within normal human parameters.")
+            reasons.append("Harmonic integrity matches organic vocal cords.")
+
+    # 3. Fallback for AI
+    if verdict == "AI/Synthetic" and not reasons:
+        reasons.append("Overall statistical profile matches synthetic training data.")
+        reasons.append("Lack of organic micro-tremors in high frequencies.")
+
+    return reasons[:3]
+
+def verdict_label(is_human):
+    return "Real Human" if is_human else "AI/Synthetic"
@@ -0,0 +1,60 @@
+"""
+Mean latency of _analyze_sync with and without the early-exit cascade.
+
+Usage (from audio-notary-backend/):
+    python -m benchmarks.bench_cascade path/to/corpus [--modes off whisper full]
+
+Point it at a mixed corpus (human + synthetic, studio + phone) so the skip rate is
+representative. The first file is analysed once up front to load Whisper and warm numba.
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+
+from app.services.forensics import _analyze_sync
+
+AUDIO_EXTS = (".wav", ".mp3", ".flac", ".m4a", ".ogg", ".webm", ".aac", ".opus")
+
+def run(files, mode):
+    latencies, verdicts, skipped = [], [], 0
+    for path in files:
+        start = time.perf_counter()
+        res = _analyze_sync(path, cascade=mode)
+        latencies.append(time.perf_counter() - start)
+        verdicts.append(res["verdict"])
+        skipped += len(res["metadata"]["skipped_stages"])
+    return latencies, verdicts, skipped
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus")
+    parser.add_argument("--modes", nargs="+", default=["off", "whisper", "full"])
+    args = parser.parse_args()
+
+    files = sorted(
+        f for f in glob.glob(os.path.join(args.corpus, "**", "*"), recursive=True)
+        if f.lower().endswith(AUDIO_EXTS)
+    )
+    if not files:
+        raise SystemExit(f"No audio files found in {args.corpus}")
+
+    _analyze_sync(files[0], cascade="off")
+
+    baseline_mean, baseline_verdicts = None, None
+    print(f"{len(files)} files")
+    print(f"{'mode':<10}{'mean s':>10}{'p50 s':>10}{'skips':>8}{'speedup':>10}{'agree':>8}")
+    for mode in args.modes:
+        latencies, verdicts, skipped = run(files, mode)
+        mean = statistics.mean(latencies)
+        if baseline_mean is None:
+            baseline_mean, baseline_verdicts = mean, verdicts
+        agree = sum(a == b for a, b in zip(verdicts, baseline_verdicts)) / len(files)
+        print(
+            f"{mode:<10}{mean:>10.3f}{statistics.median(latencies):>10.3f}"
+            f"{skipped:>8}{baseline_mean / mean:>9.2f}x{agree:>8.1%}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Replay-detection hit rate and lookup cost for the landmark fingerprints.
+
+Usage (from audio-notary-backend/):
+    python -m benchmarks.bench_fingerprint path/to/corpus [--distractors 10000]
+
+Every file is indexed in memory, then re-submitted with the edits replay attacks use
+(gain, trimming, added noise, an 8 kHz re-encode). Random distractor fingerprints pad
+the index so the offset vote sees realistic posting-list lengths. No Mongo needed.
+"""
+import argparse
+import glob
+import os
+import time
+
+import librosa
+import numpy as np
+
+from app.services.forensics import ANALYSIS_MODES, MAX_ANALYSIS_SECONDS, select_analysis_mode
+from app.services.fingerprint import (
+    landmark_hashes, vote_offsets, MATCH_MIN_HASHES, MATCH_MIN_RATIO, REUSE_MIN_RATIO,
+)
+
+AUDIO_EXTS = (".wav", ".mp3", ".flac", ".m4a", ".ogg", ".webm", ".aac", ".opus")
+
+def fingerprint(y, native_sr):
+    mode = ANALYSIS_MODES[select_analysis_mode(native_sr)]
+    sr = mode["sr"]
+    if native_sr != sr:
+        y = librosa.resample(y, orig_sr=native_sr, target_sr=sr)
+    y = librosa.util.normalize(y)
+    S = np.abs(librosa.stft(y, n_fft=mode["n_fft"], hop_length=mode["hop_length"]))
+    return landmark_hashes(S, sr, mode["hop_length"])
+
+def edits(y, sr, rng):
+    yield "identical", y, sr
+    yield "gain -14 dB", y * 0.2, sr
+    yield "trim 2.3 s", y[int(2.3 * sr):], sr
+    yield "noise 20 dB", y + rng.standard_normal(len(y)).astype(np.float32) * np.std(y) * 0.1, sr
+    yield "8 kHz re-encode", librosa.resample(y, orig_sr=sr, target_sr=8000), 8000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus")
+    parser.add_argument("--distractors", type=int, default=10000)
+    args = parser.parse_args()
+
+    files = sorted(
+        f for f in glob.glob(os.path.join(args.corpus, "**", "*"), recursive=True)
+        if f.lower().endswith(AUDIO_EXTS)
+    )
+    rng = np.random.default_rng(0)
+
+    clips, p_hash, p_report, p_t = [], [], [], []
+    for i, path in enumerate(files):
+        y, sr = librosa.load(path, sr=None, duration=MAX_ANALYSIS_SECONDS)
+        hashes, offsets = fingerprint(y, sr)
+        clips.append((y, sr))
+        p_hash.append(hashes)
+        p_t.append(offsets)
+        p_report.append(np.full(hashes.size, i))
+
+    # Distractors: uniformly random 25-bit hashes, ~700 per clip
+    per_clip = 700
+    p_hash.append(rng.integers(0, 1 << 25, args.distractors * per_clip).astype(np.uint32))
+    p_t.append(rng.integers(0, 2800, args.distractors * per_clip).astype(np.uint16))
+    p_report.append(np.repeat(np.arange(len(files), len(files) + args.distractors), per_clip))
+    p_hash, p_report, p_t = np.concatenate(p_hash), np.concatenate(p_report), np.concatenate(p_t)
+    print(f"{len(files)} clips + {args.distractors} distractors, {p_hash.size} postings")
+
+    by_hash = np.argsort(p_hash, kind="stable")
+    p_hash, p_report, p_t = p_hash[by_hash], p_report[by_hash], p_t[by_hash]
+
+    results = {}
+    for i, (y, sr) in enumerate(clips):
+        for name, edited, edited_sr in edits(y, sr, rng):
+            hashes, offsets = fingerprint(edited, edited_sr)
+            start = time.perf_counter()
+            # What the Mongo $in returns: every posting whose hash is in the query
+            lo = np.searchsorted(p_hash, np.unique(hashes), side="left")
+            hi = np.searchsorted(p_hash, np.unique(hashes), side="right")
+            hits = np.concatenate([np.arange(a, b) for a, b in zip(lo, hi)] or [np.empty(0, dtype=np.int64)])
+            ids, votes = vote_offsets(hashes, offsets, p_hash[hits], p_report[hits], p_t[hits])
+            elapsed = time.perf_counter() - start
+
+            ratio = votes[0] / max(hashes.size, 1) if votes.size else 0.0
+            found = bool(ids.size) and ids[0] == i and votes[0] >= MATCH_MIN_HASHES and ratio >= MATCH_MIN_RATIO
+            row = results.setdefault(name, {"found": 0, "reusable": 0, "ms": [], "postings": []})
+            row["found"] += found
+            row["reusable"] += found and ratio >= REUSE_MIN_RATIO
+            row["ms"].append(elapsed * 1000)
+            row["postings"].append(hits.size)
+
+    print(f"{'edit':<18}{'flagged':>9}{'reusable':>10}{'vote ms':>9}{'postings':>10}")
+    for name, row in results.items():
+        print(
+            f"{name:<18}{row['found'] / len(clips):>9.0%}{row['reusable'] / len(clips):>10.0%}"
+            f"{np.mean(row['ms']):>9.2f}{int(np.mean(row['postings'])):>10}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+How the analysis path behaves under overload, slow stages and client disconnects.
+
+Usage (from audio-notary-backend/):
+    python -m benchmarks.bench_overload path/to/corpus [--jobs 24] [--deadline 60]
+        [--slow-stage pitch|whisper --slow-seconds 5] [--cancel-after 2]
+
+Submits --jobs analyses at once through the fair scheduler, as a burst of uploads
+would arrive, and reports latency, how many finished / timed out / were cancelled and
+which stages were degraded. --slow-stage adds a delay to every pyin chunk or Whisper
+call to stand in for a pathological file. --cancel-after cancels every budget after N
+seconds (a disconnect) and reports how long workers kept running afterwards.
+"""
+import argparse
+import asyncio
+import collections
+import glob
+import os
+import statistics
+import time
+
+from app.services import forensics
+from app.services.audio_io import AudioSource
+from app.services.budget import AnalysisBudget, AnalysisCancelled
+from app.services.scheduler import analysis_scheduler
+
+AUDIO_EXTS = (".wav", ".mp3", ".flac", ".m4a", ".ogg", ".webm", ".aac", ".opus")
+
+def slow_down(stage, seconds):
+    if stage == "pitch":
+        original = forensics._track_pitch
+
+        def slow_track(y, sr, mode, tracker):
+            if tracker == "pyin":
+                time.sleep(seconds)
+            return original(y, sr, mode, tracker)
+        forensics._track_pitch = slow_track
+    elif stage == "whisper":
+        original = forensics._whisper_logprobs
+
+        def slow_whisper(audio_16k):
+            time.sleep(seconds)
+            return original(audio_16k)
+        forensics._whisper_logprobs = slow_whisper
+
+async def run_job(i, path, args, results):
+    budget = AnalysisBudget(deadline_seconds=args.deadline)
+    cancelled_at = None
+    if args.cancel_after:
+        def disconnect():
+            nonlocal cancelled_at
+            cancelled_at = time.perf_counter()
+            budget.cancel("disconnected")
+        asyncio.get_running_loop().call_later(args.cancel_after, disconnect)
+
+    start = time.perf_counter()
+    try:
+        res = await analysis_scheduler.run(
+            f"user{i % args.users}", "user", forensics._analyze_sync,
+            AudioSource.from_path(path), None, None, False, None, budget,
+        )
+        outcome, degraded = "finished", res["metadata"]["degraded_stages"]
+    except AnalysisCancelled as e:
+        outcome, degraded = e.reason, budget.degraded
+    end = time.perf_counter()
+    results.append({
+        "outcome": outcome,
+        "seconds": end - start,
+        "degraded": degraded,
+        "after_cancel": end - cancelled_at if cancelled_at else None,
+    })
+
+async def main_async(args, files):
+    results = []
+    await asyncio.gather(*(
+        run_job(i, files[i % len(files)], args, results) for i in range(args.jobs)
+    ))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus")
+    parser.add_argument("--jobs", type=int, default=24)
+    parser.add_argument("--users", type=int, default=6)
+    parser.add_argument("--deadline", type=float, default=60.0)
+    parser.add_argument("--slow-stage", choices=("pitch", "whisper"))
+    parser.add_argument("--slow-seconds", type=float, default=5.0)
+    parser.add_argument("--cancel-after", type=float, default=0.0)
+    args = parser.parse_args()
+
+    files = sorted(
+        f for f in glob.glob(os.path.join(args.corpus, "**", "*"), recursive=True)
+        if f.lower().endswith(AUDIO_EXTS)
+    )
+    if not files:
+        raise SystemExit("No audio files found")
+
+    # Warm numba and Whisper (and the stage cost estimates) before anything is timed
+    forensics._analyze_sync(files[0])
+    if args.slow_stage:
+        slow_down(args.slow_stage, args.slow_seconds)
+
+    results = asyncio.run(main_async(args, files))
+
+    latencies = sorted(r["seconds"] for r in results)
+    print(f"{args.jobs} jobs, {forensics.analysis_scheduler.workers} workers, deadline {args.deadline:.0f}s")
+    print(f"latency p50 {statistics.median(latencies):.1f}s  "
+          f"p95 {latencies[int(0.95 * (len(latencies) - 1))]:.1f}s  max {latencies[-1]:.1f}s")
+    print("outcomes:", dict(collections.Counter(r["outcome"] for r in results)))
+
+    degraded = collections.Counter(
+        f"{stage}->{info['mode']} ({info['reason']})"
+        for r in results for stage, info in r["degraded"].items()
+    )
+    print("degraded stages:", dict(degraded) or "none")
+
+    released = [r["after_cancel"] for r in results if r["outcome"] == "disconnected" and r["after_cancel"] is not None]
+    if released:
+        print(f"worker kept running after disconnect: median {statistics.median(released):.2f}s, "
+              f"max {max(released):.2f}s")
+
+if __name__ == "__main__":
+    main()
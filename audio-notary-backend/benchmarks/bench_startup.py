@@ -0,0 +1,110 @@
+"""
+Cold-start cost of the API process.
+
+Usage (from audio-notary-backend/):
+    python -m benchmarks.bench_startup [--top 25] [--path /auth/guest-login]
+
+1. Runs `python -X importtime -c "import app.main"` in a fresh interpreter and prints
+   the slowest top-level packages (cumulative import time).
+2. Launches uvicorn on a free port and measures time until the first 200 response,
+   plus the server's RSS at that point (Linux only).
+"""
+import argparse
+import collections
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+def import_report(top):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:])
+        raise SystemExit("import app.main failed")
+
+    # Lines look like: "import time:  self [us] | cumulative | imported package"
+    # Self time is summed per top-level package (numpy, torch, ...); our own app.*
+    # modules are listed with their cumulative time so you can see who pulls what in.
+    per_package = collections.Counter()
+    app_modules = {}
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = line.replace("import time:", "|", 1).split("|")
+        name = name.strip()
+        total_us += int(self_us)
+        per_package[name.split(".")[0]] += int(self_us)
+        if name.startswith("app"):
+            app_modules[name] = int(cumulative_us)
+
+    print(f"import app.main: {total_us / 1e6:.2f} s total")
+    print(f"{'package':<32}{'self ms':>10}")
+    for name, us in per_package.most_common(top):
+        print(f"{name:<32}{us / 1000:>10.1f}")
+    print()
+    print(f"{'app module':<32}{'cumulative ms':>14}")
+    for name, us in sorted(app_modules.items(), key=lambda kv: -kv[1]):
+        print(f"{name:<32}{us / 1000:>14.1f}")
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def time_to_first_200(path, method, timeout=120):
+    port = _free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        url = f"http://127.0.0.1:{port}{path}"
+        while time.perf_counter() - start < timeout:
+            try:
+                req = urllib.request.Request(url, method=method)
+                with urllib.request.urlopen(req, timeout=2) as resp:
+                    if resp.status == 200:
+                        elapsed = time.perf_counter() - start
+                        rss = _rss_mb(server.pid)
+                        print(f"time to first 200 ({method} {path}): {elapsed:.2f} s")
+                        if rss is not None:
+                            print(f"server RSS after first 200: {rss:.0f} MB")
+                        return elapsed
+            except OSError:
+                time.sleep(0.05)
+        raise SystemExit("server did not answer in time")
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--path", default="/")
+    parser.add_argument("--method", default="GET")
+    args = parser.parse_args()
+
+    os.environ.setdefault("PYTHONDONTWRITEBYTECODE", "1")
+    import_report(args.top)
+    print()
+    time_to_first_200(args.path, args.method)
+
+if __name__ == "__main__":
+    main()
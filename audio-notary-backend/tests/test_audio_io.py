@@ -0,0 +1,47 @@
+import io
+
+import numpy as np
+import pytest
+import soundfile as sf
+from fastapi import FastAPI, UploadFile, File
+from fastapi.testclient import TestClient
+
+from app.services import audio_io
+from app.services.audio_io import AudioSource, receive_upload
+from app.services.baselines import select_profile
+
+app = FastAPI()
+
+@app.post("/upload")
+async def upload(file: UploadFile = File(...)):
+    # Starlette's spooled file rolls over to an OS tempfile once it passes its limit
+    on_disk = file.file._rolled
+    source = await receive_upload(file, file.filename)
+    try:
+        return {"on_disk": on_disk, "in_memory": source.data is not None, "size": len(source.data or b"")}
+    finally:
+        source.close()
+
+client = TestClient(app)
+
+@pytest.mark.parametrize("size", [200 * 1024, 5 * 1024 * 1024])
+def test_uploads_below_the_limit_never_touch_the_disk(size):
+    reply = client.post("/upload", files={"file": ("clip.wav", b"\0" * size)}).json()
+    assert reply == {"on_disk": False, "in_memory": True, "size": size}
+
+def test_uploads_above_the_limit_go_to_scratch(monkeypatch, tmp_path):
+    monkeypatch.setattr(audio_io, "INMEMORY_MAX_BYTES", 2 * 1024 * 1024)
+    monkeypatch.setattr(audio_io, "SCRATCH_DIR", str(tmp_path))
+    reply = client.post("/upload", files={"file": ("clip.wav", b"\0" * 3 * 1024 * 1024)}).json()
+    assert reply["in_memory"] is False
+
+def test_decode_reports_the_length_of_the_whole_recording():
+    buf = io.BytesIO()
+    sf.write(buf, np.zeros(22050 * 400, dtype=np.float32), 22050, format="MP3")
+    source = AudioSource(data=buf.getvalue(), ext=".mp3")
+    y, sr = source.decode(duration=45)
+
+    assert len(y) / sr == pytest.approx(45, abs=0.1)
+    assert source.full_duration == pytest.approx(400, abs=1)
+    # Long full-band MP3s pick the studio profile even though only 45 s were decoded
+    assert select_profile(sr, ".mp3", source.full_duration) == "studio"
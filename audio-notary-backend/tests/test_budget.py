@@ -0,0 +1,212 @@
+import io
+import time
+
+import numpy as np
+import pytest
+import soundfile as sf
+from fastapi import HTTPException
+
+from app.services import budget as budget_module
+from app.services import forensics
+from app.services.audio_io import AudioSource, AudioDecodeError
+from app.services.budget import AnalysisBudget, AnalysisCancelled, analysis_http_error
+from app.services.scoring import HUMAN_BASELINE
+
+SR = 22050
+CLIP_SECONDS = 40  # three pitch chunks: 15 s, 15 s, 10 s
+
+def make_source(seconds=CLIP_SECONDS):
+    t = np.arange(int(seconds * SR)) / SR
+    y = sum(np.sin(2 * np.pi * 140 * h * t) / h for h in range(1, 6))
+    y *= 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+    buf = io.BytesIO()
+    sf.write(buf, (0.3 * y).astype(np.float32), SR, format="WAV")
+    return AudioSource(data=buf.getvalue(), ext=".wav")
+
+@pytest.fixture
+def stages(monkeypatch):
+    """
+    Replaces pyin/yin and Whisper with instant fakes (slowed down per test), keeps Mongo
+    out of the way and starts every test from the default stage cost estimates.
+    """
+    calls = {"trackers": [], "whisper": 0, "pyin_delay": 0.0, "whisper_delay": 0.0,
+             "whisper_result": [-0.3, -0.5, -0.4], "on_pitch": None}
+
+    def fake_track(y, sr, mode, tracker):
+        calls["trackers"].append(tracker)
+        if calls["on_pitch"]:
+            calls["on_pitch"]()
+        if tracker == "pyin":
+            time.sleep(calls["pyin_delay"])
+        frames = 1 + len(y) // mode["pitch_hop"]
+        return 140 + np.sin(np.arange(frames) / 5.0)
+
+    def fake_whisper(audio_16k):
+        calls["whisper"] += 1
+        time.sleep(calls["whisper_delay"])
+        return calls["whisper_result"]
+
+    monkeypatch.setattr(forensics, "_track_pitch", fake_track)
+    monkeypatch.setattr(forensics, "_whisper_logprobs", fake_whisper)
+    monkeypatch.setattr(forensics, "get_whisper_model", lambda: object())
+    monkeypatch.setattr(forensics, "get_baseline", lambda profile: dict(HUMAN_BASELINE))
+    monkeypatch.setattr(forensics.analysis_scheduler, "load_level", lambda: 0)
+    monkeypatch.setattr(budget_module, "_observed_costs", dict(budget_module.STAGE_COST_PER_AUDIO_SECOND))
+    return calls
+
+def analyze(budget=None):
+    return forensics._analyze_sync(make_source(), cascade="off", budget=budget)
+
+# ------------------------------
+# DEGRADED MODES
+# ------------------------------
+def test_heavy_load_drops_whisper_and_switches_pitch_to_yin(stages, monkeypatch):
+    monkeypatch.setattr(forensics.analysis_scheduler, "load_level", lambda: 2)
+    meta = analyze()["metadata"]
+
+    assert meta["degraded_stages"] == {
+        "pitch": {"mode": "yin", "reason": "load"},
+        "whisper": {"mode": "skipped", "reason": "load"},
+    }
+    assert meta["stages"] == ["acoustic", "pitch"]
+    assert set(stages["trackers"]) == {"yin"}
+    assert stages["whisper"] == 0
+
+def test_moderate_load_only_drops_whisper(stages, monkeypatch):
+    monkeypatch.setattr(forensics.analysis_scheduler, "load_level", lambda: 1)
+    meta = analyze()["metadata"]
+
+    assert meta["degraded_stages"] == {"whisper": {"mode": "skipped", "reason": "load"}}
+    assert set(stages["trackers"]) == {"pyin"}
+
+def test_slow_pyin_finishes_the_clip_with_yin(stages, monkeypatch):
+    monkeypatch.setitem(budget_module.STAGE_BUDGET_SECONDS, "pitch", 0.5)
+    monkeypatch.setitem(budget_module._observed_costs, "pitch", 0.001)
+    stages["pyin_delay"] = 0.4
+
+    result = analyze()
+
+    assert stages["trackers"] == ["pyin", "yin", "yin"]
+    assert result["metadata"]["degraded_stages"] == {"pitch": {"mode": "yin", "reason": "budget"}}
+    assert "whisper" in result["metadata"]["stages"]
+    assert result["features"]["jitter"] is not None
+
+def test_no_time_for_any_pitch_tracker_fails_instead_of_scoring_jitter_as_human(stages, monkeypatch):
+    monkeypatch.setitem(budget_module._observed_costs, "pitch", 10.0)
+    monkeypatch.setitem(budget_module._observed_costs, "pitch_fast", 10.0)
+
+    with pytest.raises(AnalysisCancelled) as exc:
+        analyze()
+    assert (exc.value.reason, exc.value.stage) == ("deadline", "pitch")
+    assert analysis_http_error(exc.value).status_code == 503
+    assert stages["trackers"] == []
+
+def test_whisper_skipped_when_its_estimate_exceeds_the_budget(stages, monkeypatch):
+    monkeypatch.setitem(budget_module._observed_costs, "whisper", 10.0)
+    meta = analyze()["metadata"]
+
+    assert meta["degraded_stages"] == {"whisper": {"mode": "skipped", "reason": "budget"}}
+    assert "whisper" not in meta["stages"]
+    assert stages["whisper"] == 0
+
+def test_finished_whisper_updates_the_cost_estimate(stages):
+    stages["whisper_delay"] = 0.5
+    before = budget_module._observed_costs["whisper"]
+    analyze()
+    # 0.5 s for 40 s of audio is 0.0125 s/s, far below the 0.5 s/s starting estimate
+    assert budget_module._observed_costs["whisper"] < before
+
+def test_failed_whisper_is_not_reported_as_a_stage(stages):
+    stages["whisper_result"] = None
+    before = budget_module._observed_costs["whisper"]
+    meta = analyze()["metadata"]
+
+    assert "whisper" not in meta["stages"]
+    assert meta["degraded_stages"] == {"whisper": {"mode": "skipped", "reason": "error"}}
+    assert budget_module._observed_costs["whisper"] == before
+
+def test_compare_reports_degraded_stages_per_file(stages, monkeypatch):
+    from app.services.comparison import _compare_sync
+
+    monkeypatch.setattr(forensics, "CASCADE_MODE", "off")
+    results = iter([None, [-0.3, -0.5, -0.4]])
+    monkeypatch.setattr(forensics, "_whisper_logprobs", lambda audio_16k: next(results))
+
+    result = _compare_sync(make_source(), make_source(), AnalysisBudget())
+
+    assert result["file1"]["metadata"]["degraded_stages"] == {"whisper": {"mode": "skipped", "reason": "error"}}
+    assert result["file2"]["metadata"]["degraded_stages"] == {}
+    assert "whisper" in result["file2"]["metadata"]["stages"]
+
+def test_reported_features_are_rounded_python_floats(stages):
+    features = analyze()["features"]
+    digits = {"jitter": 5, "cepstral_peak": 2, "spectral_entropy": 3, "silence_ratio": 3,
+              "mfcc_temporal_variance": 2, "energy_variation": 4}
+    for name, n in digits.items():
+        # float32 values rounded before conversion come back as e.g. 4.485000133514404
+        assert type(features[name]) is float
+        assert features[name] == float(f"{features[name]:.{n}f}"), (name, features[name])
+
+# ------------------------------
+# CANCELLATION
+# ------------------------------
+def test_disconnect_stops_the_job_at_the_next_checkpoint(stages):
+    budget = AnalysisBudget()
+    stages["on_pitch"] = lambda: budget.cancel("disconnected")
+
+    with pytest.raises(AnalysisCancelled) as exc:
+        analyze(budget)
+
+    assert exc.value.reason == "disconnected"
+    assert exc.value.stage == "pitch"
+    # The remaining pitch chunks and Whisper never ran
+    assert stages["trackers"] == ["pyin"]
+    assert stages["whisper"] == 0
+
+def test_expired_deadline_raises_before_any_work(stages):
+    with pytest.raises(AnalysisCancelled) as exc:
+        analyze(AnalysisBudget(deadline_seconds=0))
+
+    assert exc.value.reason == "deadline"
+    assert exc.value.stage == "decode"
+    assert stages["trackers"] == []
+
+def test_deadline_passing_during_a_stage_is_caught_at_the_next_one(stages):
+    budget = AnalysisBudget(deadline_seconds=60)
+    stages["on_pitch"] = lambda: setattr(budget, "deadline", time.monotonic() - 1)
+
+    with pytest.raises(AnalysisCancelled) as exc:
+        analyze(budget)
+    assert exc.value.reason == "deadline"
+    assert stages["trackers"] == ["pyin"]
+
+def test_finished_work_is_kept_past_the_deadline_but_not_after_a_disconnect():
+    budget = AnalysisBudget(deadline_seconds=0)
+    budget.check("whisper", deadline=False)
+
+    budget.cancel("disconnected")
+    with pytest.raises(AnalysisCancelled):
+        budget.check("whisper", deadline=False)
+
+# ------------------------------
+# HTTP MAPPING
+# ------------------------------
+def test_disconnect_maps_to_499():
+    assert analysis_http_error(AnalysisCancelled("disconnected", "pitch")).status_code == 499
+
+def test_deadline_maps_to_503_with_retry_after():
+    error = analysis_http_error(AnalysisCancelled("deadline", "whisper"))
+    assert error.status_code == 503
+    assert error.headers["Retry-After"] == str(budget_module.DEADLINE_RETRY_AFTER_SECONDS)
+
+def test_undecodable_upload_maps_to_422():
+    assert analysis_http_error(AudioDecodeError("not audio")).status_code == 422
+
+def test_other_errors_map_to_500_and_http_errors_pass_through():
+    assert analysis_http_error(RuntimeError("boom")).status_code == 500
+    original = HTTPException(status_code=413, detail="too big")
+    assert analysis_http_error(original) is original
+
+def test_garbage_upload_raises_decode_error():
+    with pytest.raises(AudioDecodeError):
+        AudioSource(data=b"definitely not audio", ext=".wav").decode(duration=5, timeout=5)
@@ -0,0 +1,59 @@
+import asyncio
+
+import mongomock
+import pytest
+from fastapi import HTTPException
+
+from app.routes import analyze
+from app.services import baselines
+from app.services.feature_store import pack_features
+
+ADMIN = {"role": "admin", "email": "admin@example.com"}
+
+@pytest.fixture
+def reports(monkeypatch):
+    collection = mongomock.MongoClient().db.reports
+    monkeypatch.setattr(analyze, "reports_collection", collection)
+    return collection
+
+@pytest.fixture
+def samples(monkeypatch):
+    recorded = []
+
+    def fake_record(profile, features):
+        recorded.append(profile)
+
+    monkeypatch.setattr(baselines, "record_human_sample", fake_record)
+    return recorded
+
+def insert_report(reports, **metadata):
+    raw = pack_features({"pitch_jitter": 0.01, "spectral_entropy": 5.0, "duration": 10.0})
+    return str(reports.insert_one({"raw_features": raw, "metadata": metadata}).inserted_id)
+
+def test_concurrent_confirms_record_the_sample_once(reports, samples):
+    report_id = insert_report(reports, channel_profile="studio")
+
+    async def confirm_twice():
+        return await asyncio.gather(*(analyze.confirm_human(report_id, ADMIN) for _ in range(2)))
+
+    replies = asyncio.run(confirm_twice())
+    assert samples == ["studio"]
+    assert sorted(reply["message"] for reply in replies) == ["Report already confirmed", "Sample added to baseline"]
+
+def test_failed_baseline_update_releases_the_claim(reports, monkeypatch):
+    report_id = insert_report(reports, channel_profile="studio")
+
+    def broken_record(profile, features):
+        raise RuntimeError("mongo down")
+
+    monkeypatch.setattr(baselines, "record_human_sample", broken_record)
+    with pytest.raises(RuntimeError):
+        asyncio.run(analyze.confirm_human(report_id, ADMIN))
+    assert "confirmed_human" not in reports.find_one()
+
+def test_wideband_report_cannot_feed_the_telephony_baseline(reports, samples):
+    report_id = insert_report(reports, channel_profile="telephony", analysis_mode="wideband")
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(analyze.confirm_human(report_id, ADMIN))
+    assert exc.value.status_code == 422
+    assert samples == []
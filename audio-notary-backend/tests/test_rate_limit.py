@@ -0,0 +1,36 @@
+from starlette.requests import Request
+
+from app.services import rate_limit
+from app.services.rate_limit import InMemoryBucketStore, rate_limit_key
+
+GUEST = {"role": "guest", "email": "guest"}
+
+def make_request(peer="10.0.0.5", forwarded=()):
+    headers = [(b"x-forwarded-for", value.encode()) for value in forwarded]
+    return Request({"type": "http", "headers": headers, "client": (peer, 1234)})
+
+def test_guest_key_ignores_forwarded_for_without_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_HOPS", 0)
+    assert rate_limit_key(GUEST, make_request(forwarded=["1.2.3.4"])) == "guest:10.0.0.5"
+
+def test_guest_key_uses_the_entry_the_proxy_added(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_HOPS", 1)
+    # The client forged the left-most entries; the proxy appended the real address
+    request = make_request(forwarded=["6.6.6.6, 7.7.7.7", "203.0.113.9"])
+    assert rate_limit_key(GUEST, request) == "guest:203.0.113.9"
+
+def test_forged_forwarded_for_does_not_reset_the_guest_bucket(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_HOPS", 1)
+    store = InMemoryBucketStore()
+    allowed = [
+        store.take(rate_limit_key(GUEST, make_request(forwarded=[f"6.6.6.{i}, 203.0.113.9"])), 3, 0.0, now=0)[0]
+        for i in range(5)
+    ]
+    assert allowed == [True, True, True, False, False]
+
+def test_guest_key_falls_back_to_the_peer_without_enough_hops(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_HOPS", 2)
+    assert rate_limit_key(GUEST, make_request(forwarded=["203.0.113.9"])) == "guest:10.0.0.5"
+
+def test_users_are_keyed_by_email():
+    assert rate_limit_key({"role": "user", "email": "a@b.c"}, make_request()) == "user:a@b.c"
@@ -0,0 +1,50 @@
+import asyncio
+import threading
+
+from app.services import scheduler
+from app.services.scheduler import FairScheduler
+
+def run_with_queue(jobs, check):
+    """
+    Occupies every worker with a blocked job, queues `jobs` ((role, cancel) pairs) behind
+    them and returns `check(sched)` once they are all waiting.
+    """
+    async def main():
+        sched = FairScheduler(workers=2, guest_workers=1)
+        gate = threading.Event()
+        running = [asyncio.create_task(sched.run(f"u{i}", "user", gate.wait)) for i in range(2)]
+        queued = [asyncio.create_task(sched.run(f"q{i}", role, lambda: None)) for i, (role, _) in enumerate(jobs)]
+        await asyncio.sleep(0)
+        for task, (_, cancel) in zip(queued, jobs):
+            if cancel:
+                task.cancel()
+        await asyncio.sleep(0)
+        result = check(sched)
+        gate.set()
+        await asyncio.gather(*running, *queued, return_exceptions=True)
+        return result, sched
+    return asyncio.run(main())
+
+def test_queued_user_jobs_raise_the_load_level(monkeypatch):
+    monkeypatch.setattr(scheduler, "DEGRADE_WHISPER_QUEUE", 2)
+    monkeypatch.setattr(scheduler, "DEGRADE_PITCH_QUEUE", 4)
+    level, _ = run_with_queue([("user", False)] * 2, lambda s: s.load_level())
+    assert level == 1
+    level, _ = run_with_queue([("user", False)] * 4, lambda s: s.load_level())
+    assert level == 2
+
+def test_guests_beyond_their_worker_share_do_not_degrade_users(monkeypatch):
+    monkeypatch.setattr(scheduler, "DEGRADE_WHISPER_QUEUE", 2)
+    # One guest slot is free, so only one of the queued guests can be dispatched next
+    level, _ = run_with_queue([("guest", False)] * 6, lambda s: s.load_level())
+    assert level == 0
+
+def test_cancelled_jobs_leave_the_queue_at_once(monkeypatch):
+    monkeypatch.setattr(scheduler, "DEGRADE_WHISPER_QUEUE", 2)
+    (level, queued), sched = run_with_queue(
+        [("user", True)] * 3 + [("user", False)],
+        lambda s: (s.load_level(), len(s._queue)),
+    )
+    assert (level, queued) == (0, 1)
+    # Everything drained, nothing left counted
+    assert sched._waiting == {False: 0, True: 0} and sched._queue == []